@@ -104,13 +104,10 @@ def godot_to_feagi():
             except UnicodeDecodeError as decode_error:
                 # If not JSON, assume it's a list
                 try:
-                    string_array = list(obtain_list)
-                    new_depth = (string_array[0] << 8) | string_array[1]
-                    new_width = (string_array[2] << 8) | string_array[3]
-                    image = string_array[4:]  # This removes the first two elements
-                    raw_frame = retina.RGB_list_to_ndarray(image, [new_width, new_depth])
-                    raw_frame = retina.update_astype(raw_frame)
-                    camera_data['vision'] = raw_frame
+                    new_depth = (obtain_list[0] << 8) | obtain_list[1]
+                    new_width = (obtain_list[2] << 8) | obtain_list[3]
+                    # The pixels follow the 4 bytes of size and are used in place
+                    camera_data['vision'] = retina.frame_from_buffer(obtain_list, new_width, new_depth, offset=4)
                 except Exception as list_error:
                     print(f"Error processing list: {list_error}")
                     # traceback.print_exc()
@@ -144,7 +144,7 @@ async def echo(websocket):
             if connected_agents['capabilities']:
                 cortical_stimulation['current'] = parse_chunks(decompressed_data)
                 if 'canvas' in cortical_stimulation['current']:
-                    rgb_array['current'] = {'0': retina.update_astype(cortical_stimulation['current']['canvas'])}
+                    rgb_array['current'] = {'0': cortical_stimulation['current']['canvas']}
             else:
                 if not 'current' in rgb_array:
                     rgb_array['current'] = None
@@ -183,8 +183,8 @@ def parse_chunks(data: bytes):
         size = width * height * 3
         if chunk_id == "canvas":
             pixel_count = size  # assuming RGB
-            pixels = np.frombuffer(data, dtype=np.int8, count=pixel_count, offset=offset)
-            results["canvas"] = retina.RGB_list_to_ndarray(pixels, (width, height))
+            # Passed on in the order it is received, without copying the pixels
+            results["canvas"] = retina.frame_from_buffer(data, width, height, offset=offset)
             offset += pixel_count
         elif chunk_id == "gyro01":
             float_count = size
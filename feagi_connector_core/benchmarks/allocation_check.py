@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Copyright 2016-present Neuraville Inc. All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+==============================================================================
+
+Check that steady-state bursts of the retina allocate no new frame buffers. It uses the genomes,
+capabilities and frames of retina_benchmark.py.
+
+Usage, from feagi_connector_core:
+    python benchmarks/allocation_check.py
+    python benchmarks/allocation_check.py --scenario pan --bursts 50
+
+Each scenario warms the pipeline up, then traces every measured burst on its own: tracemalloc is
+started before the burst and stopped after it. The emit stage is left out since the FEAGI data it
+produces is new by nature. The check fails when:
+- NumPy or cv2 buffers allocated during a measured burst are still alive at its end, which is
+  what happens when a region is written into a new array instead of its ping-pong buffer.
+- A burst allocates, even briefly, as much as the buffer of the central vision region. The Python
+  bookkeeping of a burst stays well under that, so it means a region-sized array was allocated.
+"""
+
+import os
+import sys
+import argparse
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import retina_benchmark as benchmark  # noqa: E402
+from feagi_connector import retina  # noqa: E402
+
+STAGES = ('gate', 'mirror', 'blink', 'crop', 'downsize', 'enhance', 'diff')
+# name -> (scenario of retina_benchmark.py, capabilities changed on every camera)
+CHECKS = {
+    'pan': ('pan', {}),
+    'noisy': ('noisy', {}),
+    'multi_camera': ('multi_camera', {}),
+    'large_pan': ('large_pan', {}),
+    'grayscale_pan': ('grayscale_pan', {}),
+    'remap_pan': ('pan', {'sampling': 'remap'}),
+    'prescale_hd_pan': ('grayscale_hd_pan', {'prescale': True}),
+    'change_gate_static': ('static', {'change_gate': 4}),
+}
+
+
+def check(name, bursts=30, warmup=10):
+    scenario, overrides = CHECKS[name]
+    genome, kind, cameras, (height, width) = benchmark.SCENARIOS[scenario]
+    benchmark.fake_genome(genome, cameras)
+    capabilities = benchmark.fake_capabilities(cameras)
+    for camera in capabilities['input']['camera'].values():
+        camera.update(overrides)
+    frames = benchmark.synthetic_frames(kind, warmup + bursts, cameras, height, width)
+    pipeline = retina.RetinaPipeline(stages=STAGES)
+
+    previous_frame_data = {}
+    for frame in frames[:warmup]:
+        previous_frame_data, _, capabilities, _ = pipeline.process(frame, capabilities, previous_frame_data, {},
+                                                                   capabilities)
+    budget = min(previous_frame_data[cortical].nbytes for cortical in previous_frame_data
+                 if cortical.endswith('_C'))
+
+    peaks = []
+    for frame in frames[warmup:]:
+        tracemalloc.start()
+        try:
+            previous_frame_data, _, capabilities, _ = pipeline.process(frame, capabilities, previous_frame_data,
+                                                                       {}, capabilities)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            snapshot = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+        new_buffers = snapshot.filter_traces([tracemalloc.DomainFilter(True, np.lib.tracemalloc_domain)])
+        statistics = new_buffers.statistics('lineno')
+        if statistics:
+            raise AssertionError("{}: {} bytes of NumPy buffers allocated by a steady-state burst, first at {}"
+                                 .format(name, sum(statistic.size for statistic in statistics),
+                                         statistics[0].traceback))
+    if max(peaks) >= budget:
+        raise AssertionError("{}: a burst allocated {} bytes, as much as the {}-byte central region buffer".format(
+            name, max(peaks), budget))
+    return {'check': name, 'peak_bytes': max(peaks), 'budget_bytes': budget}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that steady-state retina bursts allocate no frame buffers")
+    parser.add_argument('--scenario', choices=sorted(CHECKS), action='append',
+                        help="Check to run. Can be given more than once. Defaults to all of them.")
+    parser.add_argument('--bursts', type=int, default=30, help="Bursts measured per check")
+    args = parser.parse_args()
+
+    for name in args.scenario or CHECKS:
+        result = check(name, args.bursts)
+        print("{check}: ok, at most {peak_bytes} bytes allocated per burst (budget {budget_bytes})".format(**result))
+
+
+if __name__ == '__main__':
+    main()
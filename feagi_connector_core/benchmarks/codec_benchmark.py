@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Copyright 2016-present Neuraville Inc. All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+==============================================================================
+
+Benchmark of the binary codec of feagi_interface: feagi_data_to_bytes() and bytes_to_feagi_data().
+
+Usage, from feagi_connector_core:
+    python benchmarks/codec_benchmark.py
+    python benchmarks/codec_benchmark.py --neurons 10000 --neurons 100000 --json result.json
+
+Before timing anything, it checks that the codec round-trips and that it writes exactly the bytes of
+the reference encoder, which packs one neuron at a time with struct. The neurons are spread over
+cortical areas of at most 60000 neurons since the original layout stores the count of an area on
+16 bits. The compact layout is checked and timed the same way, and its size is reported.
+"""
+
+import os
+import sys
+import json
+import struct
+import argparse
+from time import perf_counter
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from feagi_connector import feagi_interface as feagi  # noqa: E402
+from feagi_connector import pns_gateway as pns  # noqa: E402
+
+NEURONS_PER_AREA = 60000
+
+
+def reference_to_bytes(feagi_data):
+    result = bytearray()
+    for cortical_id, coords in feagi_data.items():
+        result += cortical_id.encode('ascii')[:6].ljust(6, b'\x00')
+        result += struct.pack('<H', len(coords))
+        for (x, y, z), v in coords.items():
+            result += struct.pack('<III f', x, y, z, v)
+    return result
+
+
+def reference_to_feagi_data(data):
+    feagi_data = {}
+    offset = 0
+    while offset < len(data):
+        cortical_id = data[offset:offset + 6].rstrip(b'\x00').decode('ascii')
+        length = struct.unpack_from('<H', data, offset + 6)[0]
+        offset += 8
+        coords = {}
+        for _ in range(length):
+            x, y, z, v = struct.unpack_from('<III f', data, offset)
+            coords[(x, y, z)] = v
+            offset += 16
+        feagi_data[cortical_id] = coords
+    return feagi_data
+
+
+def synthetic_feagi_data(neurons, seed=0):
+    """
+    Vision-like FEAGI data: unique coordinates inside 256x256x3 areas with pixel values. The
+    dimensions of the areas are faked in pns.full_list_dimension for the compact layout.
+    """
+    rng = np.random.default_rng(seed)
+    feagi_data = {}
+    pns.full_list_dimension = {}
+    area = 0
+    while neurons > 0:
+        count = min(neurons, NEURONS_PER_AREA)
+        cells = rng.choice(256 * 256 * 3, size=count, replace=False)
+        x, y, z = cells // (256 * 3), (cells // 3) % 256, cells % 3
+        values = rng.integers(0, 256, count)
+        feagi_data['iv%02d_C' % area] = dict(zip(zip(x.tolist(), y.tolist(), z.tolist()), values.tolist()))
+        pns.full_list_dimension['iv%02d_C' % area] = {'cortical_dimensions': [256, 256, 3]}
+        neurons -= count
+        area += 1
+    return feagi_data
+
+
+def check_parity(feagi_data):
+    encoded = feagi.feagi_data_to_bytes(feagi_data)
+    if encoded != reference_to_bytes(feagi_data):
+        raise AssertionError("feagi_data_to_bytes() differs from the reference encoder")
+    if feagi.bytes_to_feagi_data(encoded) != reference_to_feagi_data(encoded):
+        raise AssertionError("bytes_to_feagi_data() differs from the reference decoder")
+    columnar = feagi.bytes_to_feagi_data(encoded, as_arrays=True)
+    if feagi.feagi_data_to_bytes(columnar) != encoded:
+        raise AssertionError("The columnar arrays do not encode back to the same bytes")
+    compact = feagi.feagi_data_to_bytes(feagi_data, compact=True)
+    if feagi.bytes_to_feagi_data(compact) != feagi_data:
+        raise AssertionError("The compact layout does not round-trip")
+    if feagi.feagi_data_to_bytes(feagi.bytes_to_feagi_data(compact, as_arrays=True)) != encoded:
+        raise AssertionError("The compact layout does not decode to the same arrays")
+
+
+def time_call(function, repeat):
+    times = []
+    for _ in range(repeat):
+        started = perf_counter()
+        function()
+        times.append(perf_counter() - started)
+    times = np.asarray(times) * 1000
+    return {'mean': float(times.mean()), 'p50': float(np.percentile(times, 50))}
+
+
+def run(neurons, repeat):
+    feagi_data = synthetic_feagi_data(neurons)
+    check_parity(feagi_data)
+    encoded = bytes(feagi.feagi_data_to_bytes(feagi_data))
+    columnar = feagi.bytes_to_feagi_data(encoded, as_arrays=True)
+    compact = bytes(feagi.feagi_data_to_bytes(columnar, compact=True))
+    functions = {
+        'encode dict (reference)': lambda: reference_to_bytes(feagi_data),
+        'encode dict': lambda: feagi.feagi_data_to_bytes(feagi_data),
+        'encode arrays': lambda: feagi.feagi_data_to_bytes(columnar),
+        'decode dict (reference)': lambda: reference_to_feagi_data(encoded),
+        'decode dict': lambda: feagi.bytes_to_feagi_data(encoded),
+        'decode arrays': lambda: feagi.bytes_to_feagi_data(encoded, as_arrays=True),
+        'encode arrays (compact)': lambda: feagi.feagi_data_to_bytes(columnar, compact=True),
+        'decode arrays (compact)': lambda: feagi.bytes_to_feagi_data(compact, as_arrays=True),
+    }
+    return {'neurons': neurons, 'bytes': len(encoded), 'compact_bytes': len(compact),
+            'ms': {name: time_call(function, repeat) for name, function in functions.items()}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the FEAGI binary codec")
+    parser.add_argument('--neurons', type=int, action='append',
+                        help="Number of neurons to encode. Can be given more than once. Defaults to 10k and 100k.")
+    parser.add_argument('--repeat', type=int, default=10, help="Runs measured per function")
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args()
+
+    results = [run(neurons, args.repeat) for neurons in (args.neurons or [10000, 100000])]
+    for result in results:
+        print("{} neurons, {} bytes, {} bytes compact (parity ok):".format(
+            result['neurons'], result['bytes'], result['compact_bytes']))
+        for name, timing in result['ms'].items():
+            print("    {:<24} {:8.3f} ms (p50 {:.3f} ms)".format(name, timing['mean'], timing['p50']))
+    if args.json:
+        with open(args.json, 'w') as result_file:
+            json.dump(results, result_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
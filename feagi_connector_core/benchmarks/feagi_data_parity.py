@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Copyright 2016-present Neuraville Inc. All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+==============================================================================
+
+Parity check of retina.create_feagi_data() against the nested loops it replaced.
+
+Usage, from feagi_connector_core:
+    python benchmarks/feagi_data_parity.py
+
+For grayscale and RGB regions of odd sizes, with and without a camera offset, the dict has to match
+the reference exactly: same keys in the same order, and plain Python ints for the coordinates and
+the values. It exits with an error on the first mismatch, then times both implementations.
+"""
+
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from feagi_connector import retina  # noqa: E402
+from feagi_connector import pns_gateway as pns  # noqa: E402
+
+# (rows, columns, depth) of the regions checked, depth 1 being grayscale
+SHAPES = [(64, 64, 3), (37, 23, 3), (1, 5, 3), (17, 9, 1), (8, 8, 1), (31, 1, 1)]
+CAMERA_INDEXES = [0, 1, 3]
+
+
+def reference_create_feagi_data(significant_changes, current, shape, index, cortical_name, grayscale=False):
+    feagi_data = {}
+    size_of_frame = shape
+    name = 'iv' + cortical_name
+    offset_x = (pns.full_list_dimension[name]['cortical_dimensions_per_device'][0] * index)
+    if len(significant_changes) > 0:
+        if grayscale:
+            for x in range(size_of_frame[0]):
+                for y in range(size_of_frame[1]):
+                    if significant_changes[x, y]:
+                        key = (offset_x + y, ((int(size_of_frame[0]) - 1) - x), 0)
+                        feagi_data[key] = int(current[x, y])
+        else:
+            for x in range(size_of_frame[0]):
+                for y in range(size_of_frame[1]):
+                    for z in range(size_of_frame[2]):
+                        if significant_changes[x, y, z]:
+                            key = (offset_x + y, ((int(size_of_frame[0]) - 1) - x), z)
+                            feagi_data[key] = int(current[x, y, z])
+    return feagi_data
+
+
+def synthetic_region(shape, seed):
+    """
+    A region and its change mask, with about a third of the entries changed.
+    """
+    rng = np.random.default_rng(seed)
+    rows, columns, depth = shape
+    array_shape = (rows, columns) if depth == 1 else shape
+    current = rng.integers(0, 256, array_shape, dtype=np.uint8)
+    significant_changes = np.where(rng.random(array_shape) > 0.66, current, 0).astype(np.uint8)
+    return significant_changes, current
+
+
+def fake_dimensions(shape, cameras):
+    rows, columns, depth = shape
+    pns.full_list_dimension = {'iv00_C': {'cortical_dimensions': [columns * cameras, rows, depth],
+                                          'cortical_dimensions_per_device': [columns, rows, depth]}}
+
+
+def check_types(feagi_data):
+    for key, value in feagi_data.items():
+        if type(value) is not int or any(type(coordinate) is not int for coordinate in key):
+            raise AssertionError("Non-int coordinate or value in " + repr((key, value)))
+
+
+def check_parity():
+    checked = 0
+    for seed, shape in enumerate(SHAPES):
+        grayscale = shape[2] == 1
+        significant_changes, current = synthetic_region(shape, seed)
+        fake_dimensions(shape, max(CAMERA_INDEXES) + 1)
+        for index in CAMERA_INDEXES:
+            expected = reference_create_feagi_data(significant_changes, current, shape, index, '00_C', grayscale)
+            result = retina.create_feagi_data(significant_changes, current, shape, index, '00_C', grayscale)
+            if list(result.items()) != list(expected.items()):
+                raise AssertionError("create_feagi_data() differs from the reference for shape {} and camera "
+                                     "index {}".format(shape, index))
+            check_types(result)
+            checked += len(result)
+        empty = np.zeros_like(significant_changes)
+        if retina.create_feagi_data(empty, current, shape, 1, '00_C', grayscale) != {}:
+            raise AssertionError("An unchanged region has to give an empty dict")
+    return checked
+
+
+def time_call(function, repeat=50):
+    started = perf_counter()
+    for _ in range(repeat):
+        function()
+    return (perf_counter() - started) / repeat * 1000000
+
+
+def main():
+    neurons = check_parity()
+    print("create_feagi_data: parity ok on {} shapes, {} neurons compared".format(len(SHAPES), neurons))
+    shape = (64, 64, 3)
+    significant_changes, current = synthetic_region(shape, 0)
+    fake_dimensions(shape, 2)
+    for name, function in (('reference', reference_create_feagi_data), ('create_feagi_data', retina.create_feagi_data)):
+        print("    {:<18} {:8.1f} us (64x64x3)".format(
+            name, time_call(lambda: function(significant_changes, current, shape, 1, '00_C'))))
+
+
+if __name__ == '__main__':
+    main()
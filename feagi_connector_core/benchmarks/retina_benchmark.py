@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Copyright 2016-present Neuraville Inc. All Rights Reserved.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+==============================================================================
+
+Offline benchmark of the retina hot path. No FEAGI is needed: the genome is faked through
+`pns.full_list_dimension` and `pns.resize_list`, and the frames are synthetic.
+
+Usage, from feagi_connector_core:
+    python benchmarks/retina_benchmark.py
+    python benchmarks/retina_benchmark.py --scenario pan --bursts 200 --json result.json
+
+For every scenario it reports the time per stage of a burst, the memory allocated during a burst
+and the number of neurons sent to FEAGI. It also times create_feagi_data, change_detector and
+downsize_regions on their own.
+"""
+
+import os
+import sys
+import json
+import argparse
+import tracemalloc
+from time import perf_counter
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from feagi_connector import retina  # noqa: E402
+from feagi_connector import pns_gateway as pns  # noqa: E402
+
+PERIPHERAL_REGIONS = ['TL', 'TM', 'TR', 'ML', 'MR', 'BL', 'BM', 'BR']
+
+# name -> (central size, peripheral size, center focus size or None)
+GENOMES = {
+    'default': ((64, 64, 3), (8, 8, 1), None),
+    'large': ((128, 128, 3), (32, 32, 1), (64, 64, 3)),
+    'grayscale': ((64, 64, 1), (8, 8, 1), (32, 32, 1)),
+}
+
+# name -> (genome, frame kind, number of cameras, frame height and width)
+SCENARIOS = {
+    'static': ('default', 'static', 1, (480, 640)),
+    'noisy': ('default', 'noisy', 1, (480, 640)),
+    'pan': ('default', 'pan', 1, (480, 640)),
+    'multi_camera': ('default', 'pan', 2, (480, 640)),
+    'large_pan': ('large', 'pan', 1, (480, 640)),
+    'grayscale_pan': ('grayscale', 'pan', 1, (480, 640)),
+    'grayscale_hd_pan': ('grayscale', 'pan', 1, (1080, 1920)),
+}
+
+
+def fake_genome(name='default', cameras=1, camera_index='00'):
+    """
+    Fill pns.full_list_dimension and pns.resize_list as if FEAGI had sent a genome.
+    """
+    central, peripheral, center_focus = GENOMES[name]
+    sizes = {camera_index + region: peripheral for region in PERIPHERAL_REGIONS}
+    sizes[camera_index + '_C'] = central
+    if center_focus:
+        sizes[camera_index + 'CC'] = center_focus
+    pns.full_list_dimension = {}
+    for region, size in sizes.items():
+        pns.full_list_dimension['iv' + region] = {
+            'cortical_dimensions': [size[0] * cameras, size[1], size[2]],
+            'cortical_dimensions_per_device': list(size)}
+    pns.resize_list = retina.obtain_cortical_vision_size(response=pns.full_list_dimension,
+                                                         camera_index=camera_index)
+    pns.update_resize_list_generation()
+
+
+def fake_capabilities(cameras=1):
+    capabilities = {'input': {'camera': {}}}
+    for camera in range(cameras):
+        capabilities['input']['camera'][str(camera)] = {
+            'index': '00',
+            'mirror': True,
+            'eccentricity_control': {'X offset percentage': 20, 'Y offset percentage': 25},
+            'modulation_control': {'X offset percentage': 60, 'Y offset percentage': 50},
+            'feagi_index': camera}
+    return pns.create_runtime_default_list({}, capabilities)
+
+
+def synthetic_frames(kind, bursts, cameras=1, height=480, width=640, seed=0):
+    """
+    Build the frame sequence of a scenario. Frames are smooth so the downsized regions look like
+    a camera image rather than white noise.
+
+    - static: the same frame every burst.
+    - noisy: a static frame with 20% of its pixels replaced by noise every burst.
+    - pan: the frame slides sideways, so most of the image changes every burst.
+    """
+    rng = np.random.default_rng(seed)
+    base = cv2.resize(rng.integers(0, 256, (12, 16, 3), dtype=np.uint8), (width, height),
+                      interpolation=cv2.INTER_LINEAR)
+    frames = []
+    for burst in range(bursts):
+        if kind == 'static':
+            frame = base.copy()
+        elif kind == 'noisy':
+            frame = base.copy()
+            noise = rng.random((height, width)) > 0.8
+            frame[noise] = rng.integers(0, 256, (int(noise.sum()), 3), dtype=np.uint8)
+        elif kind == 'pan':
+            frame = np.roll(base, 16 * burst, axis=1)
+        else:
+            raise ValueError("Unknown frame kind: " + kind)
+        if cameras > 1:
+            frame = {camera: np.roll(frame, 5 * camera, axis=0) for camera in range(cameras)}
+        frames.append(frame)
+    return frames
+
+
+def count_neurons(vision_data):
+    return sum(len(region) for region in vision_data.values())
+
+
+def run_scenario(name, bursts=100, warmup=5):
+    genome, kind, cameras, (height, width) = SCENARIOS[name]
+    fake_genome(genome, cameras)
+    capabilities = fake_capabilities(cameras)
+    frames = synthetic_frames(kind, bursts + warmup, cameras, height, width)
+    stage_times = {}
+    pipeline = retina.RetinaPipeline(
+        timing_hook=lambda stage, seconds: stage_times.setdefault(stage, []).append(seconds))
+
+    previous_frame_data = {}
+    for frame in frames[:warmup]:
+        previous_frame_data, _, capabilities, _ = pipeline.process(frame, capabilities, previous_frame_data, {},
+                                                                   capabilities)
+    stage_times.clear()
+
+    burst_times = []
+    neurons = []
+    for frame in frames[warmup:]:
+        started = perf_counter()
+        previous_frame_data, rgb, capabilities, _ = pipeline.process(frame, capabilities, previous_frame_data, {},
+                                                                     capabilities)
+        burst_times.append(perf_counter() - started)
+        neurons.append(count_neurons(rgb['camera']))
+    stage_ms = {stage: float(np.mean(times) * 1000) for stage, times in stage_times.items()}
+
+    # Allocations are measured in a separate pass since tracemalloc slows everything down
+    allocations = []
+    for frame in frames[warmup:warmup + min(bursts, 20)]:
+        tracemalloc.start()
+        previous_frame_data, _, capabilities, _ = pipeline.process(frame, capabilities, previous_frame_data, {},
+                                                                   capabilities)
+        allocations.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    return {
+        'scenario': name,
+        'bursts': bursts,
+        'burst_ms': summarize(burst_times, 1000),
+        'stage_ms': stage_ms,
+        'peak_allocation_kb': float(np.mean(allocations) / 1024),
+        'neurons': {'mean': float(np.mean(neurons)), 'max': int(np.max(neurons))},
+    }
+
+
+def run_functions(repeat=200):
+    """
+    Time the building blocks of the hot path on their own, on a 64x64 color region.
+    """
+    fake_genome('default')
+    rng = np.random.default_rng(1)
+    frame = cv2.resize(rng.integers(0, 256, (12, 16, 3), dtype=np.uint8), (640, 480))
+    previous = cv2.resize(frame[:240, :320], (64, 64))
+    current = cv2.resize(np.roll(frame, 16, axis=1)[:240, :320], (64, 64))
+    change = retina.change_detector(previous, current, src=50)
+    size = pns.resize_list['00_C']
+    functions = {
+        'downsize_regions': lambda: retina.downsize_regions(frame[:240, :320], size),
+        'change_detector': lambda: retina.change_detector(previous, current, src=50),
+        'create_feagi_data': lambda: retina.create_feagi_data(change, current, previous.shape, 0, '00_C'),
+    }
+    results = {}
+    for name, function in functions.items():
+        times = []
+        for _ in range(repeat):
+            started = perf_counter()
+            function()
+            times.append(perf_counter() - started)
+        results[name] = summarize(times, 1000000)
+    results['create_feagi_data']['neurons'] = int(np.count_nonzero(change))
+    return results
+
+
+def summarize(times, scale):
+    times = np.asarray(times) * scale
+    return {'mean': float(times.mean()), 'p50': float(np.percentile(times, 50)),
+            'p95': float(np.percentile(times, 95))}
+
+
+def print_report(scenarios, functions):
+    for result in scenarios:
+        print("{scenario}: {mean:.3f} ms/burst (p95 {p95:.3f} ms), {allocation:.1f} KB allocated/burst, "
+              "{neurons:.0f} neurons/burst (max {maximum})".format(
+                scenario=result['scenario'], mean=result['burst_ms']['mean'], p95=result['burst_ms']['p95'],
+                allocation=result['peak_allocation_kb'], neurons=result['neurons']['mean'],
+                maximum=result['neurons']['max']))
+        for stage, milliseconds in result['stage_ms'].items():
+            print("    {:<10} {:.3f} ms".format(stage, milliseconds))
+    print("functions (64x64 color region):")
+    for name, result in functions.items():
+        print("    {:<18} {:.1f} us (p95 {:.1f} us)".format(name, result['mean'], result['p95']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the retina hot path")
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), action='append',
+                        help="Scenario to run. Can be given more than once. Defaults to all of them.")
+    parser.add_argument('--bursts', type=int, default=100, help="Bursts measured per scenario")
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args()
+
+    scenarios = [run_scenario(name, args.bursts) for name in (args.scenario or SCENARIOS)]
+    functions = run_functions()
+    print_report(scenarios, functions)
+    if args.json:
+        with open(args.json, 'w') as result_file:
+            json.dump({'scenarios': scenarios, 'functions': functions}, result_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
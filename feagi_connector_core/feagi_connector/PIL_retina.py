@@ -17,8 +17,30 @@ limitations under the License.
 """
 
 from PIL import Image
+from feagi_connector import retina
 
 
 def obtain_size(data):
     return data.size
 
+
+# PIL image mode -> channel order understood by retina.frame_from_buffer()
+image_mode_channel_orders = {'RGB': 'RGB', 'RGBA': 'RGBA', 'L': 'GRAY'}
+
+
+def image_to_frame(image):
+    """
+    Convert a PIL image to a frame the retina can process. The pixels are read from the image
+    buffer in one go and only reordered from RGB to BGR, which is what camera frames use.
+
+    Inputs:
+    - image: a PIL Image. Modes other than RGB, RGBA and L are converted to RGB first.
+
+    Output:
+    - A uint8 ndarray of shape (height, width, 3) in BGR order, or (height, width) for L images.
+    """
+    if image.mode not in image_mode_channel_orders:
+        image = image.convert('RGB')
+    width, height = obtain_size(image)
+    return retina.frame_from_buffer(image.tobytes(), width, height,
+                                    image_mode_channel_orders[image.mode])
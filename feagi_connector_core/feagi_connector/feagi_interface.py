@@ -11,6 +11,8 @@ import traceback
 import pkg_resources
 from time import sleep
 import struct
+import itertools
+import numpy as np
 
 import feagi_connector
 from feagi_connector import retina
@@ -232,47 +234,178 @@ def opu_processor(data):
         # pass
 
 
-def feagi_data_to_bytes(feagi_data):
+# A compact payload starts with this byte, which cannot start the original layout since that one
+# opens with an ASCII cortical ID, followed by the version of the compact layout.
+compact_bytes_marker = 0xFE
+compact_bytes_version = 1
+# width code stored in the area header of the compact layout -> dtype of the column
+compact_column_dtypes = {0: np.dtype('<u1'), 1: np.dtype('<u2'), 2: np.dtype('<u4'), 3: np.dtype('<f4')}
+compact_area_header = struct.Struct('<6s4BI')  # cortical ID, x/y/z/value width codes, neuron count
+
+
+def feagi_data_to_bytes(feagi_data, compact=False):
+    """
+    Encode FEAGI data into bytes. Every cortical area is written as its 6-byte ID, padded with zeros,
+    a uint16 neuron count and one (x, y, z, value) record of `retina.columnar_dtype` per neuron,
+    all little endian.
+
+    With `compact`, the payload opens with `compact_bytes_marker` and `compact_bytes_version`. Each
+    area then stores its ID, the width code of the x, y, z and value columns, a uint32 count and the
+    four columns one after the other. Coordinates use the smallest unsigned type that holds the
+    dimensions of the area in `pns.full_list_dimension` and its data. Values use uint8 or uint16
+    when they are all whole numbers in range, float32 otherwise. Vision data takes 4 bytes per
+    neuron instead of 16.
+
+    Args:
+    - feagi_data: {cortical_id: neurons}, where neurons is a {(x, y, z): value} dict or an array of
+                  `retina.columnar_dtype` such as the columnar payload of the retina.
+    - compact: Write the compact layout.
+
+    Returns:
+    - A bytearray holding every cortical area one after the other.
+    """
     result = bytearray()
+    if compact:
+        result += bytes((compact_bytes_marker, compact_bytes_version))
 
     for cortical_id, coords in feagi_data.items():
         # Ensure cortical_id is 6 bytes, padded or trimmed
         cid = cortical_id.encode('ascii')[:6].ljust(6, b'\x00')
+        records = feagi_data_to_columnar(coords)
+
+        if compact:
+            codes = compact_column_codes(cortical_id, records)
+            result += compact_area_header.pack(cid, *codes, len(records))
+            for name, code in zip(retina.columnar_dtype.names, codes):
+                result += records[name].astype(compact_column_dtypes[code]).tobytes()
+            continue
+
+        if len(records) > 0xFFFF:
+            raise ValueError("Cortical area " + cortical_id + " has " + str(len(records)) +
+                             " neurons, the count is limited to 65535 unless compact is set")
         result += cid
-
         # Write length (number of (x, y, z, v) sets)
-        length = len(coords)
-        result += struct.pack('<H', length)  # uint16, little endian
-
-        # Add each (x, y, z, v)
-        for (x, y, z), v in coords.items():
-            result += struct.pack('<III f', x, y, z, v)  # 3x uint32, 1x float32
+        result += struct.pack('<H', len(records))  # uint16, little endian
+        result += records.tobytes()
 
     return result
 
 
-def bytes_to_feagi_data(data: bytes):
+def feagi_data_to_columnar(coords):
+    """
+    Turn the neurons of a cortical area into one contiguous array of `retina.columnar_dtype`.
+    Arrays that already have that layout are returned as is.
+    """
+    if isinstance(coords, np.ndarray):
+        if coords.dtype == retina.columnar_dtype:
+            return np.ascontiguousarray(coords)
+        return coords.astype(retina.columnar_dtype)
+    records = np.empty(len(coords), dtype=retina.columnar_dtype)
+    if len(coords):
+        positions = np.fromiter(itertools.chain.from_iterable(coords), dtype=np.int64,
+                                count=3 * len(coords)).reshape(-1, 3)
+        if positions.min() < 0 or positions.max() > 0xFFFFFFFF:
+            raise ValueError("Neuron coordinates must fit in an unsigned 32-bit integer")
+        records['x'] = positions[:, 0]
+        records['y'] = positions[:, 1]
+        records['z'] = positions[:, 2]
+        records['value'] = np.fromiter(coords.values(), dtype=np.float32, count=len(coords))
+    return records
+
+
+def compact_column_codes(cortical_id, records):
+    """
+    Pick the width codes of the x, y, z and value columns of a cortical area for the compact layout.
+    The coordinates are sized from the dimensions of the area when FEAGI sent them, so an area keeps
+    the same widths from one burst to the next, and widened if the data goes beyond them.
+    """
+    dimensions = None
+    if isinstance(pns.full_list_dimension, dict) and cortical_id in pns.full_list_dimension:
+        dimensions = pns.full_list_dimension[cortical_id]['cortical_dimensions']
+    codes = []
+    for axis, name in enumerate(('x', 'y', 'z')):
+        largest = int(records[name].max()) if len(records) else 0
+        if dimensions:
+            largest = max(largest, int(dimensions[axis]) - 1)
+        codes.append(next(code for code in (0, 1, 2) if largest <= np.iinfo(compact_column_dtypes[code]).max))
+    values = records['value']
+    value_code = 3
+    for code in (0, 1):
+        if len(values) == 0 or (values.min() >= 0 and values.max() <= np.iinfo(compact_column_dtypes[code]).max
+                                and np.array_equal(values, np.floor(values))):
+            value_code = code
+            break
+    codes.append(value_code)
+    return codes
+
+
+def bytes_to_feagi_data(data: bytes, as_arrays=False):
+    """
+    Decode the bytes written by `feagi_data_to_bytes()`, in the original or the compact layout.
+
+    Args:
+    - data: bytes, bytearray or memoryview.
+    - as_arrays: When True, every cortical area is returned as an array of `retina.columnar_dtype`
+                 instead of a {(x, y, z): value} dict. With the original layout, the arrays are
+                 read-only views pointing into `data`.
+
+    Returns:
+    - {cortical_id: neurons}
+    """
+    if len(data) and data[0] == compact_bytes_marker:
+        areas = compact_bytes_to_columnar(data)
+    else:
+        areas = bytes_to_columnar(data)
+
     feagi_data = {}
+    for cortical_id, records in areas:
+        if as_arrays:
+            feagi_data[cortical_id] = records
+        else:
+            keys = zip(records['x'].tolist(), records['y'].tolist(), records['z'].tolist())
+            feagi_data[cortical_id] = dict(zip(keys, records['value'].tolist()))
+    return feagi_data
+
+
+def bytes_to_columnar(data):
+    """
+    Yield (cortical_id, records) for every area of the original layout.
+    """
     offset = 0
 
     while offset < len(data):
         # Read 6-byte cortical area ID
-        cortical_id = data[offset:offset + 6].rstrip(b'\x00').decode('ascii')
+        cortical_id = bytes(data[offset:offset + 6]).rstrip(b'\x00').decode('ascii')
         offset += 6
 
         # Read length (number of (x, y, z, v) sets)
         length = struct.unpack_from('<H', data, offset)[0]
         offset += 2
 
-        coords = {}
-        for _ in range(length):
-            x, y, z, v = struct.unpack_from('<III f', data, offset)
-            coords[(x, y, z)] = v
-            offset += 16  # 4 + 4 + 4 + 4 bytes
+        records = np.frombuffer(data, dtype=retina.columnar_dtype, count=length, offset=offset)
+        offset += length * retina.columnar_dtype.itemsize  # 4 + 4 + 4 + 4 bytes
+        yield cortical_id, records
 
-        feagi_data[cortical_id] = coords
 
-    return feagi_data
+def compact_bytes_to_columnar(data):
+    """
+    Yield (cortical_id, records) for every area of the compact layout.
+    """
+    if data[1] != compact_bytes_version:
+        raise ValueError("Unsupported version of the compact FEAGI bytes: " + str(data[1]))
+    offset = 2
+
+    while offset < len(data):
+        cid, x_code, y_code, z_code, value_code, length = compact_area_header.unpack_from(data, offset)
+        offset += compact_area_header.size
+        records = np.empty(length, dtype=retina.columnar_dtype)
+        for name, code in zip(retina.columnar_dtype.names, (x_code, y_code, z_code, value_code)):
+            if code not in compact_column_dtypes:
+                raise ValueError("Unknown column width code " + str(code) + " in the compact FEAGI bytes")
+            column_dtype = compact_column_dtypes[code]
+            records[name] = np.frombuffer(data, dtype=column_dtype, count=length, offset=offset)
+            offset += length * column_dtype.itemsize
+        yield cid.rstrip(b'\x00').decode('ascii'), records
 
 
 def control_data_processor(data):
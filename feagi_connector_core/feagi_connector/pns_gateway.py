@@ -33,9 +33,11 @@ global_ID_cortical_size = None
 full_list_dimension = []
 full_template_information_corticals = []
 resize_list = {}
+resize_list_generation = 0  # Bumped whenever resize_list or full_list_dimension is replaced
 previous_genome_timestamp = 0
 genome_tracker = 0
 message_from_feagi = {}
+feagi_message_condition = threading.Condition()  # Notified each time message_from_feagi is replaced
 refresh_rate = 0.01
 ver = "local"
 
@@ -54,7 +56,7 @@ def create_env_again():
 def generate_feagi_data(rgb, message_to_feagi):
     """
     This function generates data for Feagi by combining RGB values, message counter, and date into
-    the provided message.
+    the provided message. Regions in columnar mode are passed along as arrays without expanding them.
     """
     try:
         if rgb:
@@ -314,6 +316,7 @@ def check_genome_status(message_from_feagi, capabilities):
             full_list_dimension = []
         if len(full_list_dimension) == 0:
             full_list_dimension = fetch_full_dimensions()
+            update_resize_list_generation()
         if len(full_template_information_corticals) == 0:
             full_template_information_corticals = fetch_full_template_information()
         genome_changed = detect_genome_change(message_from_feagi)
@@ -324,6 +327,7 @@ def check_genome_status(message_from_feagi, capabilities):
                 for index in capabilities['input']['camera']:
                     resize_list = retina.obtain_cortical_vision_size(camera_index=capabilities['input']['camera'][index]["index"], response=response)
             previous_genome_timestamp = message_from_feagi["genome_changed"]
+            update_resize_list_generation()
         current_tracker = obtain_genome_number(genome_tracker, message_from_feagi)
         if len(resize_list) == 0:
             response = full_list_dimension
@@ -331,9 +335,53 @@ def check_genome_status(message_from_feagi, capabilities):
                 if 'camera' in capabilities['input']:
                     for index in capabilities['input']['camera']:
                         resize_list = retina.obtain_cortical_vision_size(camera_index=capabilities['input']['camera'][index]["index"], response=response)
+            update_resize_list_generation()
         if genome_tracker != current_tracker:
             full_list_dimension = fetch_full_dimensions()
             genome_tracker = current_tracker
+            update_resize_list_generation()
+
+
+def update_resize_list_generation():
+    """
+    Mark every cached vision layout as stale. It needs to be called each time resize_list or
+    full_list_dimension is replaced or updated, so the retina rebuilds its regions on the next frame.
+    """
+    global resize_list_generation
+    resize_list_generation += 1
+    retina.clear_region_layout_cache()
+
+
+def publish_message_from_feagi(message):
+    """
+    Store the latest message from FEAGI and wake up every thread waiting in `wait_for_new_burst()`.
+    The listeners in router.py call it for each message they receive.
+    """
+    global message_from_feagi
+    with feagi_message_condition:
+        message_from_feagi = message
+        feagi_message_condition.notify_all()
+
+
+def wait_for_new_burst(burst_counter, timeout=None):
+    """
+    Block until FEAGI sends a message of a burst other than `burst_counter`.
+
+    Inputs:
+    - burst_counter: the `burst_counter` of the last message the caller processed.
+    - timeout: seconds to wait at most. None waits until the next burst.
+
+    Output:
+    - The new message_from_feagi, or None when the timeout expired first.
+    """
+    with feagi_message_condition:
+        if feagi_message_condition.wait_for(lambda: is_new_burst(message_from_feagi, burst_counter), timeout):
+            return message_from_feagi
+    return None
+
+
+def is_new_burst(message, burst_counter):
+    return bool(message) and message.get('burst_counter') != burst_counter
 
 
 def check_genome_status_no_vision(message_from_feagi):
@@ -349,16 +397,19 @@ def check_genome_status_no_vision(message_from_feagi):
                 full_list_dimension = []
             if len(full_list_dimension) == 0:
                 full_list_dimension = fetch_full_dimensions()
+                update_resize_list_generation()
             if len(full_template_information_corticals) == 0:
                 full_template_information_corticals = fetch_full_template_information()
             genome_changed = detect_genome_change(message_from_feagi)
             if genome_changed != previous_genome_timestamp:
                 full_list_dimension = fetch_full_dimensions()
                 previous_genome_timestamp = message_from_feagi["genome_changed"]
+                update_resize_list_generation()
             current_tracker = obtain_genome_number(genome_tracker, message_from_feagi)
             if genome_tracker != current_tracker:
                 full_list_dimension = fetch_full_dimensions()
                 genome_tracker = current_tracker
+                update_resize_list_generation()
 
 
 def fetch_threshold_type(message_from_feagi, capabilities):
@@ -389,6 +440,12 @@ def create_runtime_default_list(list, capabilities):
         "vision_range" # min, max
         "size_list" # To get the size in real time based on genome's change/update
         "enhancement" # Controlled by enhancement OPU on inside the genome
+        "columnar_payload" # Send each vision region as one structured numpy array instead of a dict
+        "change_budget" # Send the strongest changes up to percentage_to_allow_data instead of dropping the region
+        "region_update_rate" # Process a region every Nth burst, e.g. {'_C': 1, 'peripheral': 4}
+        "sampling" # "resize" crops and resizes each region, "remap" samples every region with one cv2.remap
+        "prescale" # Shrink large frames as far as the genome allows before cropping
+        "change_gate" # Skip regions whose thumbnail blocks changed by no more than this, 0 turns it off
     """
     if not list:
         list = {
@@ -414,6 +471,18 @@ def create_runtime_default_list(list, capabilities):
                         "enhancement": {},  # Enable ov_enh OPU on inside the genome
                         "percentage_to_allow_data": 1.0,
                         # this will be percentage for the full data.,
+                        "columnar_payload": False,
+                        # True sends retina.columnar_dtype arrays per region instead of dicts
+                        "change_budget": False,
+                        # True keeps the largest changes within percentage_to_allow_data on busy frames
+                        "region_update_rate": {},
+                        # region name or 'peripheral' -> N to update that region every Nth burst only
+                        "sampling": "resize",
+                        # "remap" downsizes every region with a single cv2.remap call per frame
+                        "prescale": False,
+                        # True shrinks the frame with INTER_AREA first, down to the largest cortical area
+                        "change_gate": 0,
+                        # Block mean change (0-255) below which a region is reported unchanged without diffing
                         "dev_index": 0
                     }
                 }
@@ -18,9 +18,11 @@ limitations under the License.
 
 import cv2
 import numpy
+import threading
 import numpy as np
-from time import sleep
+from time import sleep, perf_counter
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from feagi_connector import pns_gateway as pns
 
 genome_tracker = 0
@@ -28,6 +30,36 @@ previous_genome_timestamp = 0
 current_dimension_list = {}
 current_mirror_status = False
 preview_flag = False
+preview_fps = 15  # most redraws per second of the preview windows
+vision_preview = None  # VisionPreview shared by every pipeline, see obtain_vision_preview()
+vision_preview_lock = threading.Lock()
+# Layout of a region in columnar payload mode. It matches the (x, y, z, value) record written by
+# feagi_interface.feagi_data_to_bytes() so both can share the same buffers.
+columnar_dtype = np.dtype([('x', '<u4'), ('y', '<u4'), ('z', '<u4'), ('value', '<f4')])
+# (frame shape, eccentricity, modulation, camera index, resize_list generation) -> region layout
+region_layout_cache = {}
+# id of a cached region layout -> (region layout, remap sampling plan) built by vision_remap_layout()
+remap_layout_cache = {}
+# same key as region_layout_cache -> whole factor the frame can be shrunk by, see vision_prescale_factor()
+prescale_factor_cache = {}
+# id of a cached region layout -> (region layout, thumbnail blocks of every region), see change_gate_blocks()
+change_gate_cache = {}
+# camera index -> (enhancement values, 256-entry lookup table) built by obtain_enhancement_lut()
+enhancement_lut_cache = {}
+parallel_camera_workers = 0  # 2 or more processes the cameras of a frame on a thread pool of that size
+remap_packed_width = 1024  # width of the packed buffer used by sample_vision_regions()
+change_gate_size = (32, 24)  # width and height of the thumbnail compared by the change gate
+change_gate_samples = 8  # pixels sampled per block along each axis to build the thumbnail
+# regions of a camera. Their cortical names are the camera index followed by the region name
+vision_region_names = ('TL', 'TM', 'TR', 'ML', '_C', 'MR', 'BL', 'BM', 'BR', 'CC')
+# channel order of a raw image -> (channels, cv2 conversion to the BGR order of camera frames or None)
+ingest_channel_orders = {
+    'BGR': (3, None),
+    'RGB': (3, cv2.COLOR_RGB2BGR),
+    'BGRA': (4, cv2.COLOR_BGRA2BGR),
+    'RGBA': (4, cv2.COLOR_RGBA2BGR),
+    'GRAY': (1, None),
+}
 
 
 def get_device_of_vision(device):
@@ -48,7 +80,8 @@ def vision_frame_capture(device=0, rgb_flag=True):
     Capture frames from the specified `device`, which represents the camera source.
 
     Args:
-    - device: The camera device obtained using the `get_device_of_vision()` function.
+    - device: The camera device obtained using the `get_device_of_vision()` function, or a started
+              `VisionCaptureService` to get its latest frame without waiting on the camera.
     - RGB_flag: A boolean indicating whether to retrieve data in RGB format (default: True).
       If set to False, the function returns grayscale data.
 
@@ -58,6 +91,8 @@ def vision_frame_capture(device=0, rgb_flag=True):
       Example format: [[x, y, z], [x, y, z]].
     """
 
+    if isinstance(device, VisionCaptureService):
+        return device.read(rgb_flag)
     check, frame = device.read()  # 0 is the default
 
     if rgb_flag:
@@ -66,6 +101,186 @@ def vision_frame_capture(device=0, rgb_flag=True):
         return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), datetime.now(), check
 
 
+class VisionCaptureService:
+    """
+    Reads a camera on its own thread so the controller loop never waits on camera I/O.
+
+    Frames go into three preallocated buffers that rotate between the capture thread, the latest
+    frame slot and the reader. The newest frame always wins: a frame that is replaced before
+    anyone reads it counts as dropped.
+
+    Args:
+    - device: The path to the file, video, or webcam, as accepted by `get_device_of_vision()`.
+              An object that is already opened is used as is.
+    - retry_delay: Seconds to wait after a failed read before trying again.
+    """
+
+    def __init__(self, device=0, retry_delay=0.005):
+        if isinstance(device, (int, str)):
+            device = get_device_of_vision(device)
+        self.device = device
+        self.retry_delay = retry_delay
+        self.buffers = [None, None, None]
+        self.capture_index, self.latest_index, self.reader_index = 0, 1, 2
+        self.latest_timestamp = None
+        self.reader_timestamp = None
+        self.fresh_frame = False
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread = None
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.failed_reads = 0
+        self.last_capture_latency = 0.0
+        self.total_capture_latency = 0.0
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.thread = threading.Thread(target=self.capture_loop, name='retina_capture', daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+
+    def capture_loop(self):
+        while self.running:
+            started = perf_counter()
+            check, frame = self.device.read(self.buffers[self.capture_index])
+            latency = perf_counter() - started
+            if not check or frame is None:
+                self.failed_reads += 1
+                sleep(self.retry_delay)
+                continue
+            # read() writes into the given buffer when the size matches, otherwise it allocates a new one
+            self.buffers[self.capture_index] = frame
+            with self.lock:
+                if self.fresh_frame:
+                    self.frames_dropped += 1
+                self.capture_index, self.latest_index = self.latest_index, self.capture_index
+                self.latest_timestamp = datetime.now()
+                self.fresh_frame = True
+                self.frames_captured += 1
+                self.last_capture_latency = latency
+                self.total_capture_latency += latency
+
+    def read(self, rgb_flag=True):
+        """
+        Return the newest frame without waiting, in the same (frame, timestamp, check) form as
+        `vision_frame_capture()`. check is False until the first frame arrives. When no new frame
+        came in since the last call, the previous one is returned again.
+
+        The color frame stays valid until the next call to read().
+        """
+        with self.lock:
+            if self.fresh_frame:
+                self.reader_index, self.latest_index = self.latest_index, self.reader_index
+                self.reader_timestamp = self.latest_timestamp
+                self.fresh_frame = False
+        frame = self.buffers[self.reader_index]
+        if frame is None:
+            return None, datetime.now(), False
+        if rgb_flag:
+            return frame, self.reader_timestamp, True
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), self.reader_timestamp, True
+
+    def statistics(self):
+        """
+        Return the capture counters: frames captured and dropped, failed reads, and the last and
+        average time spent inside device.read() in seconds.
+        """
+        with self.lock:
+            average_latency = 0.0
+            if self.frames_captured:
+                average_latency = self.total_capture_latency / self.frames_captured
+            return {'frames_captured': self.frames_captured,
+                    'frames_dropped': self.frames_dropped,
+                    'failed_reads': self.failed_reads,
+                    'last_capture_latency': self.last_capture_latency,
+                    'average_capture_latency': average_latency}
+
+
+class VisionPreview:
+    """
+    Shows the preview windows on a thread of its own so the vision loop never waits on
+    `cv2.imshow` or `cv2.waitKey`.
+
+    show() only replaces the pending set of frames: the newest set always wins and older ones that
+    were never drawn count as dropped. The thread draws at most `fps` times per second and owns
+    every HighGUI call.
+
+    Args:
+    - fps: Maximum number of times per second the windows are redrawn.
+    """
+
+    def __init__(self, fps=15):
+        self.fps = fps
+        self.pending = None
+        self.lock = threading.Lock()
+        self.frame_ready = threading.Event()
+        self.running = False
+        self.thread = None
+        self.frames_shown = 0
+        self.frames_dropped = 0
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.thread = threading.Thread(target=self.render_loop, name='retina_preview', daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        self.frame_ready.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+
+    def show(self, frames):
+        """
+        Queue a dictionary of window name -> image. The images must not be modified afterwards.
+        """
+        with self.lock:
+            if self.pending is not None:
+                self.frames_dropped += 1
+            self.pending = frames
+        self.frame_ready.set()
+
+    def render_loop(self):
+        while self.running:
+            self.frame_ready.wait(0.1)
+            started = perf_counter()
+            with self.lock:
+                frames = self.pending
+                self.pending = None
+                self.frame_ready.clear()
+            if frames:
+                for name in frames:
+                    cv2.imshow(name, frames[name])
+                self.frames_shown += 1
+            # waitKey also keeps the windows responsive while no frame comes in
+            cv2.waitKey(1)
+            remaining = 1.0 / self.fps - (perf_counter() - started)
+            if frames and remaining > 0:
+                sleep(remaining)
+
+
+def obtain_vision_preview():
+    """
+    Return the preview shared by every pipeline, starting it on first use.
+    """
+    global vision_preview
+    with vision_preview_lock:
+        if vision_preview is None:
+            vision_preview = VisionPreview(fps=preview_fps).start()
+    return vision_preview
+
+
 def vision_region_coordinates(frame_width=None, frame_height=None, x1=None, x2=None, y1=None,
                               y2=None, camera_index="0", size_list=None):
     """
@@ -123,6 +338,241 @@ def vision_region_coordinates(frame_width=None, frame_height=None, x1=None, x2=N
     return region_coordinates
 
 
+def vision_region_layout(frame_shape=None, x1=None, x2=None, y1=None, y2=None, camera_index="0",
+                         size_list=None, mirror=False):
+    """
+    Cached version of `vision_region_coordinates()`.
+
+    The rectangles only move when eccentricity, modulation or the genome changes, so they are
+    computed once per combination and reused on every frame after that.
+
+    With `mirror`, the rectangles are those of the horizontally flipped frame, expressed in the
+    unflipped frame. Each region then carries the remap maps that `downsize_regions()` needs to
+    produce exactly what it would have produced from the flipped frame, so the full frame never
+    has to be flipped.
+
+    Inputs:
+    - frame_shape: Shape of the frame, (height, width) or (height, width, depth).
+    - x1, x2, y1, y2, camera_index, size_list: Same as `vision_region_coordinates()`.
+    - mirror: Whether the camera is mirrored.
+
+    Output:
+    - region_layout: Dictionary with one entry per region, holding a tuple of
+                     ((row slice, column slice), target size, mirror map). Regions that cover
+                     the same rectangle, such as '_C' and 'CC', share the same slice tuple. The
+                     mirror map is None unless `mirror` is set.
+    """
+    key = (frame_shape[0], frame_shape[1], x1, x2, y1, y2, camera_index, mirror, pns.resize_list_generation)
+    region_layout = region_layout_cache.get(key)
+    if region_layout is None:
+        region_coordinates = vision_region_coordinates(frame_width=frame_shape[1],
+                                                       frame_height=frame_shape[0], x1=x1, x2=x2,
+                                                       y1=y1, y2=y2, camera_index=camera_index,
+                                                       size_list=size_list)
+        crops = {}
+        region_layout = {}
+        for region, (left, top, right, bottom) in region_coordinates.items():
+            if mirror:
+                left, right = frame_shape[1] - right, frame_shape[1] - left
+            if (left, top, right, bottom) not in crops:
+                crops[(left, top, right, bottom)] = (slice(top, bottom), slice(left, right))
+            size = grab_cortical_resolution('iv' + region, region)
+            mirror_map = None
+            if mirror:
+                mirror_map = mirrored_region_map(crops[(left, top, right, bottom)], size)
+            region_layout[region] = (crops[(left, top, right, bottom)], size, mirror_map)
+        region_layout_cache[key] = region_layout
+    return region_layout
+
+
+def mirrored_region_map(crop, size):
+    """
+    `cv2.remap` maps, relative to the crop, that pick the same pixels as `cv2.resize` with
+    INTER_NEAREST would pick from the horizontally flipped crop.
+    """
+    rows, columns = crop
+    source_y = region_source_pixels(slice(0, rows.stop - rows.start), int(size[1]))
+    source_x = region_source_pixels(slice(0, columns.stop - columns.start), int(size[0]), mirror=True)
+    map_x, map_y = np.meshgrid(source_x.astype(np.float32), source_y.astype(np.float32))
+    return map_x, map_y
+
+
+def clear_region_layout_cache():
+    """
+    Drop every cached region layout. Called by eccentricity, modulation and genome updates.
+    """
+    region_layout_cache.clear()
+    remap_layout_cache.clear()
+    prescale_factor_cache.clear()
+    change_gate_cache.clear()
+
+
+def change_gate_blocks(region_layout, frame_shape):
+    """
+    Blocks of the change gate thumbnail covered by every region of a layout, as (row slice,
+    column slice) of a `change_gate_size` thumbnail. Empty regions get None. Cached per layout.
+    """
+    cached = change_gate_cache.get(id(region_layout))
+    if cached is not None and cached[0] is region_layout:
+        return cached[1]
+    width, height = change_gate_size
+    blocks = {}
+    for region, ((rows, columns), _, _) in region_layout.items():
+        if rows.stop <= rows.start or columns.stop <= columns.start:
+            blocks[region] = None
+            continue
+        blocks[region] = (slice(rows.start * height // frame_shape[0],
+                                -(-rows.stop * height // frame_shape[0])),
+                          slice(columns.start * width // frame_shape[1],
+                                -(-columns.stop * width // frame_shape[1])))
+    change_gate_cache[id(region_layout)] = (region_layout, blocks)
+    return blocks
+
+
+def change_gate_thumbnail(frame, sampled=None, dst=None):
+    """
+    Mean of every block of the frame, estimated from `change_gate_samples` pixels per block and
+    axis. Averaging the whole frame would cost as much as the work the gate tries to save.
+    `sampled` and `dst` are optional preallocated arrays for the sampled pixels and the thumbnail.
+    """
+    width, height = change_gate_size
+    sampled_size = (width * change_gate_samples, height * change_gate_samples)
+    if frame.shape[1] > sampled_size[0] and frame.shape[0] > sampled_size[1]:
+        frame = copy_into_destination(cv2.resize(frame, sampled_size, dst=sampled, interpolation=cv2.INTER_NEAREST),
+                                      sampled)
+    return copy_into_destination(cv2.resize(frame, change_gate_size, dst=dst, interpolation=cv2.INTER_AREA), dst)
+
+
+def vision_prescale_factor(frame_shape=None, x1=None, x2=None, y1=None, y2=None, camera_index="0",
+                           size_list=None):
+    """
+    Largest whole factor the frame can be shrunk by before cropping while every region still has
+    at least as many pixels as its cortical area along both axes. Empty regions are ignored.
+
+    The factor is derived from the region layout of the full frame, then checked against the
+    layout of the shrunk frame since the rectangles are rounded again at that size. It is cached
+    like the layout itself.
+
+    Inputs:
+    - frame_shape, x1, x2, y1, y2, camera_index, size_list: Same as `vision_region_layout()`.
+
+    Output:
+    - An integer of 1 or more. 1 means the frame cannot be shrunk.
+    """
+    key = (frame_shape[0], frame_shape[1], x1, x2, y1, y2, camera_index, pns.resize_list_generation)
+    factor = prescale_factor_cache.get(key)
+    if factor is None:
+        factor = max(prescale_ratio(vision_region_layout(frame_shape, x1, x2, y1, y2, camera_index, size_list)), 1)
+        while factor > 1 and prescale_ratio(vision_region_layout(
+                (frame_shape[0] // factor, frame_shape[1] // factor), x1, x2, y1, y2, camera_index, size_list)) < 1:
+            factor -= 1
+        prescale_factor_cache[key] = factor
+    return factor
+
+
+def prescale_ratio(region_layout):
+    """
+    Smallest whole number of source pixels per cortical pixel among the non-empty regions. 0 means
+    at least one region is smaller than its cortical area.
+    """
+    ratio = None
+    for (rows, columns), size, _ in region_layout.values():
+        if rows.stop <= rows.start or columns.stop <= columns.start:
+            continue
+        region_ratio = min((columns.stop - columns.start) // int(size[0]), (rows.stop - rows.start) // int(size[1]))
+        if ratio is None or region_ratio < ratio:
+            ratio = region_ratio
+    if ratio is None:
+        return 1
+    return ratio
+
+
+def vision_remap_layout(region_layout):
+    """
+    Build the `cv2.remap` sampling plan of a region layout, once per layout.
+
+    The target pixels of every region are laid end to end in one packed buffer, color regions
+    first and grayscale regions last, so a single remap call samples all of them from the raw
+    frame. Color regions sample the same source pixels as `cv2.resize` with INTER_NEAREST.
+    Grayscale regions sample the center of each cell instead of averaging it like INTER_AREA.
+
+    Output:
+    - (map_x, map_y, regions, gray_range). regions holds (start, stop, (height, width)) per region
+      in pixels of the packed buffer, and gray_range the (start, stop) of the grayscale part.
+    """
+    cached = remap_layout_cache.get(id(region_layout))
+    if cached is not None and cached[0] is region_layout:
+        return cached[1]
+    ordered_regions = sorted(region_layout, key=lambda region: region_layout[region][1][2] == 1)
+    map_x, map_y, regions = [], [], {}
+    offset, gray_start = 0, None
+    for region in ordered_regions:
+        (rows, columns), size, mirror_map = region_layout[region]
+        width, height = int(size[0]), int(size[1])
+        if size[2] == 1 and gray_start is None:
+            gray_start = offset
+        source_x = region_source_pixels(columns, width, center=size[2] == 1, mirror=mirror_map is not None)
+        source_y = region_source_pixels(rows, height, center=size[2] == 1)
+        grid_x, grid_y = np.meshgrid(source_x, source_y)
+        map_x.append(grid_x.ravel())
+        map_y.append(grid_y.ravel())
+        regions[region] = (offset, offset + width * height, (height, width))
+        offset += width * height
+    if gray_start is None:
+        gray_start = offset
+    # cv2.remap is limited to 32767 pixels per side, so the packed pixels are wrapped into rows
+    packed_rows = max(1, -(-offset // remap_packed_width))
+    padding = np.full(packed_rows * remap_packed_width - offset, -1.0)
+    remap_plan = (np.concatenate(map_x + [padding]).astype(np.float32).reshape(packed_rows, remap_packed_width),
+                  np.concatenate(map_y + [padding]).astype(np.float32).reshape(packed_rows, remap_packed_width),
+                  regions, (gray_start, offset))
+    remap_layout_cache[id(region_layout)] = (region_layout, remap_plan)
+    return remap_plan
+
+
+def region_source_pixels(crop, target, center=False, mirror=False):
+    """
+    Source coordinate of every target pixel along one axis of a crop. An empty crop maps outside
+    of the frame so the region comes out black, like `downsize_regions()` does. With `mirror`, the
+    coordinates are those of the flipped crop.
+    """
+    length = crop.stop - crop.start
+    if length <= 0:
+        return np.full(target, -1.0)
+    if center:
+        source = np.floor((np.arange(target) + 0.5) * (length / target))
+    else:
+        source = np.floor(np.arange(target) * (1.0 / (target / length)))
+    source = np.minimum(source, length - 1)
+    if mirror:
+        return (crop.stop - 1) - source
+    return source + crop.start
+
+
+def sample_vision_regions(frame, remap_plan, dst=None):
+    """
+    Downsize every region of a frame with one `cv2.remap` call and a single grayscale conversion.
+
+    Output:
+    - (regions, packed). regions holds a view into `packed` per region, so they are only valid
+      until `packed` is reused.
+    """
+    map_x, map_y, regions, (gray_start, gray_stop) = remap_plan
+    packed = cv2.remap(frame, map_x, map_y, cv2.INTER_NEAREST, dst=dst, borderMode=cv2.BORDER_CONSTANT,
+                       borderValue=0)
+    pixels = packed.reshape(-1, packed.shape[2]) if packed.ndim == 3 else packed.reshape(-1)
+    gray_pixels = pixels[gray_start:gray_stop]
+    if gray_stop > gray_start and packed.ndim == 3:
+        gray_pixels = cv2.cvtColor(gray_pixels.reshape(1, -1, packed.shape[2]), cv2.COLOR_BGR2GRAY).reshape(-1)
+    sampled = {}
+    for region, (start, stop, shape) in regions.items():
+        if start >= gray_start:
+            sampled[region] = gray_pixels[start - gray_start:stop - gray_start].reshape(shape)
+        else:
+            sampled[region] = pixels[start:stop].reshape(shape + pixels.shape[1:])
+    return sampled, packed
+
+
 def split_vision_regions(coordinates, raw_frame_data):
     """
     Split a frame into separate regions based on provided coordinates.
@@ -149,7 +599,22 @@ def split_vision_regions(coordinates, raw_frame_data):
     return frame_segments
 
 
-def downsize_regions(frame, resize):
+def split_vision_regions_from_layout(region_layout, raw_frame_data):
+    """
+    Same as `split_vision_regions()` but driven by `vision_region_layout()`. Regions that share a
+    rectangle also share the same view of the frame.
+    """
+    crops = {}
+    frame_segments = dict()
+    for region in region_layout:
+        crop = region_layout[region][0]
+        if id(crop) not in crops:
+            crops[id(crop)] = raw_frame_data[crop]
+        frame_segments[region] = crops[id(crop)]
+    return frame_segments
+
+
+def downsize_regions(frame, resize, dst=None, mirror_map=None, flip_buffer=None):
     """
     Downsize regions within a frame using specified width and height for compression.
 
@@ -158,9 +623,15 @@ def downsize_regions(frame, resize):
     The frame should be represented as a NumPy ndarray.
 
     Inputs:
-    - frame: NumPy ndarray representing the image/frame data.
+    - frame: NumPy ndarray representing the image/frame data. For a depth of 1, the frame can
+             already be grayscale.
     - resize: Tuple containing width and height values for compression.
               Example: (8, 8), (64, 64), (64, 32)
+    - dst: Optional preallocated array of the target size to write the result into.
+    - mirror_map: The mirror map of the region from `vision_region_layout()`. When given, the
+                  result is the one of the horizontally flipped frame.
+    - flip_buffer: Optional preallocated array of the grayscale frame shape. A grayscale frame that
+                   needs to be flipped before resizing is flipped into it.
 
     Output:
     - compressed_dict: Dictionary containing compressed data for nine regions.
@@ -172,11 +643,17 @@ def downsize_regions(frame, resize):
 
     if resize[2] == 3:
         try:
-            compressed_dict = cv2.resize(frame, [int(resize[0]), int(resize[1])],
+            if mirror_map is not None:
+                return copy_into_destination(cv2.remap(frame, mirror_map[0], mirror_map[1], cv2.INTER_NEAREST,
+                                                       dst=dst), dst)
+            compressed_dict = cv2.resize(frame, [int(resize[0]), int(resize[1])], dst=dst,
                                          interpolation=cv2.INTER_NEAREST)
-            return compressed_dict
+            return copy_into_destination(compressed_dict, dst)
         except Exception as e:
             # print("error inside downsize_regions on retina.py: ", e)
+            if dst is not None:
+                dst[...] = 0
+                return dst
             compressed_dict = np.zeros(resize, dtype=np.uint8)
             compressed_dict = update_astype(compressed_dict)
             return compressed_dict
@@ -184,17 +661,62 @@ def downsize_regions(frame, resize):
     # In case of grayscale image
     if resize[2] == 1:
         try:
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            compressed_dict = cv2.resize(frame, [resize[0], resize[1]],
+            if frame.ndim == 3:
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            # INTER_AREA is only guaranteed to be symmetric when the scale is a whole number. Then
+            # the small result is flipped, otherwise the grayscale crop is flipped before resizing.
+            flip_result = mirror_map is not None and frame.shape[1] % resize[0] == 0 and \
+                frame.shape[0] % resize[1] == 0
+            if mirror_map is not None and not flip_result:
+                if flip_buffer is None or flip_buffer.shape != frame.shape:
+                    flip_buffer = None
+                frame = copy_into_destination(cv2.flip(frame, 1, dst=flip_buffer), flip_buffer)
+            compressed_dict = cv2.resize(frame, [resize[0], resize[1]], dst=dst,
                                          interpolation=cv2.INTER_AREA)
+            compressed_dict = copy_into_destination(compressed_dict, dst)
+            if flip_result:
+                cv2.flip(compressed_dict, 1, dst=compressed_dict)
             return compressed_dict
         except Exception as e:
             # print(e)
+            if dst is not None:
+                dst[...] = 0
+                return dst
             compressed_dict = np.zeros(resize, dtype=np.uint8)
             compressed_dict = update_astype(compressed_dict)
             return compressed_dict
 
 
+def grayscale_bounds(region_layout, skipped_regions=()):
+    """
+    Smallest (row slice, column slice) of the frame covering every grayscale region, or None when
+    there is none to convert.
+    """
+    top, left, bottom, right = None, None, None, None
+    for region, ((rows, columns), size, _) in region_layout.items():
+        if size[2] != 1 or region in skipped_regions or rows.stop <= rows.start or columns.stop <= columns.start:
+            continue
+        if top is None:
+            top, left, bottom, right = rows.start, columns.start, rows.stop, columns.stop
+        else:
+            top, left = min(top, rows.start), min(left, columns.start)
+            bottom, right = max(bottom, rows.stop), max(right, columns.stop)
+    if top is None:
+        return None
+    return slice(top, bottom), slice(left, right)
+
+
+def copy_into_destination(data, dst=None):
+    """
+    Make sure a cv2 result ends up inside `dst`. cv2 normally writes straight into it, but can hand
+    back a new array when it is unable to use the given buffer.
+    """
+    if dst is None or data is dst:
+        return data
+    dst[...] = data
+    return dst
+
+
 def create_feagi_data(significant_changes, current, shape, index, cortical_name, grayscale=False):
     """
         :param significant_changes: An array of modified data derived from the raw data.
@@ -205,37 +727,82 @@ def create_feagi_data(significant_changes, current, shape, index, cortical_name,
         :param grayscale: A boolean indicating if the data is grayscale. True for 3 dimensions, false for 1 dimension.
         :return: A dictionary of difference locations in the FEAGI format.
     """
-    # start_time = datetime.now()
     feagi_data = {}
-    size_of_frame = shape
+    if len(significant_changes) > 0:
+        x, y, z, value = create_feagi_coordinates(significant_changes, current, shape, index,
+                                                  cortical_name, grayscale=grayscale)
+        feagi_data = dict(zip(zip(x.tolist(), y.tolist(), z.tolist()), value.tolist()))
+    return feagi_data
+
+
+def create_feagi_coordinates(significant_changes, current, shape, index, cortical_name, grayscale=False):
+    """
+    Vectorized core of `create_feagi_data()`. Locates every non-zero entry of the change mask with
+    a single `np.nonzero` pass and converts it to FEAGI coordinates.
+
+        :param significant_changes: An array of modified data derived from the raw data.
+        :param current: The current raw data.
+        :param shape: The shape of the array (e.g., '(64, 64, 3)').
+        :param index: An index within [input][camera].
+        :param cortical_name: An ID for the cortical area.
+        :param grayscale: A boolean indicating if the data is grayscale.
+        :return: Four 1-D arrays (x, y, z, value) in the same order as the pixels in the frame.
+    """
     name = 'iv' + cortical_name
     offset_x = (pns.full_list_dimension[name]['cortical_dimensions_per_device'][0] * index)
-    if len(significant_changes) > 0:
-        if grayscale:
-            for x in range(size_of_frame[0]):
-                for y in range(size_of_frame[1]):
-                    if significant_changes[x, y]:
-                        # key = f'{offset_x + y}-{((int(size_of_frame[0]) - 1) - x)}-{0}'
-                        key = (offset_x + y, ((int(size_of_frame[0]) - 1) - x), 0)
-                        # key = f'{y}-{(int(size_of_frame[0]) - 1) - x}-{0}'
-                        feagi_data[key] = int(current[x, y])
-        else:
-            for x in range(size_of_frame[0]):
-                for y in range(size_of_frame[1]):
-                    for z in range(size_of_frame[2]):
-                        if significant_changes[x, y, z]:
-                            # key = f'{offset_x + y}-{((int(size_of_frame[0]) - 1) - x)}-{z}'
-                            key = (offset_x + y, ((int(size_of_frame[0]) - 1) - x), z)
-                            # key = f'{y}-{((int(size_of_frame[0]) - 1) - x)}-{z}'
-                            feagi_data[key] = int(current[x, y, z])
+    if grayscale:
+        row, column = np.nonzero(significant_changes)[:2]
+        depth = np.zeros_like(row)
+        value = current[row, column]
+    else:
+        row, column, depth = np.nonzero(significant_changes)
+        value = current[row, column, depth]
+    # The frame is stored top-down while FEAGI counts y from the bottom, hence the row flip
+    return offset_x + column, (int(shape[0]) - 1) - row, depth, value.astype(int)
+
+
+def create_feagi_columnar_data(significant_changes, current, shape, index, cortical_name, grayscale=False):
+    """
+    Columnar version of `create_feagi_data()`. Instead of a dict keyed by (x, y, z) tuples, the
+    changes are packed into one contiguous structured array of `columnar_dtype`, so no Python
+    object is created per neuron and the payload pickles as a single buffer.
+
+        :param significant_changes: An array of modified data derived from the raw data.
+        :param current: The current raw data.
+        :param shape: The shape of the array (e.g., '(64, 64, 3)').
+        :param index: An index within [input][camera].
+        :param cortical_name: An ID for the cortical area.
+        :param grayscale: A boolean indicating if the data is grayscale.
+        :return: A structured ndarray with the fields x, y, z and value.
+    """
+    if len(significant_changes) == 0:
+        return np.zeros(0, dtype=columnar_dtype)
+    x, y, z, value = create_feagi_coordinates(significant_changes, current, shape, index,
+                                              cortical_name, grayscale=grayscale)
+    feagi_data = np.empty(len(x), dtype=columnar_dtype)
+    feagi_data['x'] = x
+    feagi_data['y'] = y
+    feagi_data['z'] = z
+    feagi_data['value'] = value
     return feagi_data
 
 
-def get_difference_from_two_images(previous, current):
+def columnar_to_feagi_data(feagi_data):
+    """
+    Expand a columnar region back into the regular {(x, y, z): value} dict. Meant for consumers
+    that still expect the dict layout; the hot path should keep the array as is.
+    """
+    if isinstance(feagi_data, dict):
+        return feagi_data
+    keys = zip(feagi_data['x'].tolist(), feagi_data['y'].tolist(), feagi_data['z'].tolist())
+    return dict(zip(keys, feagi_data['value'].astype(int).tolist()))
+
+
+def get_difference_from_two_images(previous, current, dst=None):
     """
     Compare two images and detect which pixel changed using cv2 functions.
     """
-    return cv2.absdiff(previous, current)
+    return cv2.absdiff(previous, current, dst=dst)
 
 
 def vision_blink(image, blink):
@@ -248,11 +815,11 @@ def vision_blink(image, blink):
     return image[1]
 
 
-def apply_threshold(difference, src=50):
-    return cv2.threshold(difference, src, 255, cv2.THRESH_TOZERO)
+def apply_threshold(difference, src=50, dst=None):
+    return cv2.threshold(difference, src, 255, cv2.THRESH_TOZERO, dst=dst)
 
 
-def change_detector(previous, current, src=50, compare_image=True, cortical_name=""):
+def change_detector(previous, current, src=50, compare_image=True, cortical_name="", buffers=None):
     """
     Detects changes between previous and current frames and checks against a threshold.
 
@@ -262,30 +829,71 @@ def change_detector(previous, current, src=50, compare_image=True, cortical_name
     Inputs:
     - previous: Dictionary with 'cortical' keys containing NumPy ndarray frames.
     - current: Dictionary with 'cortical' keys containing NumPy ndarray frames.
+    - buffers: Optional (difference, threshold) arrays shaped like `current` to write into instead
+               of new arrays. The returned array is then only valid until they are reused.
 
     Output:
     - Dictionary containing changes in the ndarray frames.
     """
     if current.shape == previous.shape:
+        difference_buffer, threshold_buffer = None, None
+        if buffers is not None:
+            difference_buffer, threshold_buffer = buffers
         if compare_image:
-            difference = get_difference_from_two_images(previous, current)
+            difference = get_difference_from_two_images(previous, current, dst=difference_buffer)
         else:
             difference = current
-        _, pixel_change_threshold = apply_threshold(difference, src=src)
+        _, pixel_change_threshold = apply_threshold(difference, src=src, dst=threshold_buffer)
         return pixel_change_threshold
     else:
         return {}
 
 
+def region_buffer_shape(size, width_multiplier=1):
+    """
+    Shape of the array cv2 produces for a region of `size` (width, height, depth).
+    """
+    if size[2] == 1:
+        return int(size[1]), int(size[0]) * width_multiplier
+    return int(size[1]), int(size[0]) * width_multiplier, int(size[2])
+
+
 def generate_vision_ipu_data(cortical_name, pixel_change_threshold, current, previous, feagi_index, percentage=1.0,
-                             grayscale=False):
-    if drop_high_frequency_events(pixel_change_threshold) <= \
-            (get_full_dimension_of_cortical_area(cortical_name) * percentage):
-        feagi_data = create_feagi_data(pixel_change_threshold, current, previous.shape, feagi_index,
-                                       cortical_name, grayscale=grayscale)
-        return dict(feagi_data)
-    else:
-        return {}
+                             grayscale=False, columnar=False, change_budget=False):
+    """
+    Convert the thresholded change of a region into FEAGI data.
+
+    When more than `percentage` of the region changed, the whole region is dropped for this burst.
+    With `change_budget`, only the pixels with the largest change are sent instead, up to that same
+    limit.
+    """
+    budget = get_full_dimension_of_cortical_area(cortical_name) * percentage
+    if drop_high_frequency_events(pixel_change_threshold) > budget:
+        if not change_budget:
+            if columnar:
+                return np.zeros(0, dtype=columnar_dtype)
+            return {}
+        pixel_change_threshold = select_largest_changes(pixel_change_threshold, int(budget))
+    if columnar:
+        return create_feagi_columnar_data(pixel_change_threshold, current, previous.shape, feagi_index,
+                                          cortical_name, grayscale=grayscale)
+    feagi_data = create_feagi_data(pixel_change_threshold, current, previous.shape, feagi_index,
+                                   cortical_name, grayscale=grayscale)
+    return dict(feagi_data)
+
+
+def select_largest_changes(pixel_change_threshold, budget):
+    """
+    Keep the `budget` entries with the largest change and zero the rest. np.argpartition finds them
+    in linear time without sorting the whole region.
+    """
+    budgeted = np.zeros_like(pixel_change_threshold)
+    if budget <= 0:
+        return budgeted
+    flat_change = pixel_change_threshold.reshape(-1)
+    largest = np.argpartition(flat_change, -budget)[-budget:]
+    budgeted.reshape(-1)[largest] = flat_change[largest]
+    return budgeted
 
 
 def flip_the_camera(data):
@@ -309,168 +917,187 @@ def get_full_dimension_of_cortical_area(cortical_name=""):
         current_dimension_list[cortical_name][2]
 
 
-def process_visual_stimuli(raw_data_from_controller, capabilities, previous_frame_data, rgb, actual_capabilities,
-                           compare_image=True):
+class RetinaPipeline:
     """
-    This is the most critical function for retina and deserves a doc string
-
-    # todo: add docstring!
-    Order of operations:
-    1.
-    2.
-    3.
-    4.
+    Turns raw camera frames into FEAGI vision data.
+
+    Each pipeline owns its per-camera state: the multi-camera mosaic, the ping-pong frame buffers,
+    the change detection buffers and its thread pool. Several pipelines can therefore run in the
+    same process without stepping on each other. The region layouts and the enhancement tables are
+    shared since they only depend on the genome and the camera settings.
+
+    A burst runs the stages in this order:
+    1. gate: with the change_gate capability, compare a thumbnail of every camera with the one of
+             the last processed frame and leave out the regions that did not change.
+    2. mirror: mirror the regions when the camera is mirrored. The frame itself is not flipped,
+               the layout points at the mirrored rectangles instead.
+    3. blink: apply a pending blink from FEAGI.
+    4. crop: split the frame into the central and peripheral regions.
+    5. downsize: scale every region to the resolution of its cortical area.
+    6. enhance: apply brightness, contrast and shadow.
+    7. diff: compare each region with the previous frame. Without it, the current frame is only
+             thresholded, which is what the trainer needs.
+    8. emit: turn the changed pixels into FEAGI data.
 
+    Args:
+    - stages: Names of the stages to run. Defaults to all of them. crop and downsize are required.
+    - workers: Size of the per-camera thread pool. None follows the module's
+               `parallel_camera_workers`.
+    - timing_hook: Optional callable. After every burst it is called once per stage that ran as
+                   timing_hook(stage, seconds).
+    - preview_regions: Region suffixes shown when `preview_flag` is set.
     """
-
-    global current_dimension_list, current_mirror_status, preview_flag
-
-    if isinstance(raw_data_from_controller, numpy.ndarray):
-        temp_dict = {0: raw_data_from_controller}
-        raw_data_from_controller = temp_dict.copy()
-    capabilities = pns.create_runtime_default_list(capabilities, actual_capabilities)
-
-    raw_frame = {}
-    if pns.resize_list:
+    stage_names = ('gate', 'mirror', 'blink', 'crop', 'downsize', 'enhance', 'diff', 'emit')
+    required_stages = ('crop', 'downsize')
+
+    def __init__(self, stages=None, workers=None, timing_hook=None, preview_regions=("_C", "CC")):
+        if stages is None:
+            stages = self.stage_names
+        self.stages = frozenset(stages)
+        unknown_stages = self.stages.difference(self.stage_names)
+        if unknown_stages:
+            raise ValueError("Unknown retina stages: " + ", ".join(sorted(unknown_stages)))
+        for stage in self.required_stages:
+            if stage not in self.stages:
+                raise ValueError("The retina cannot run without the " + stage + " stage")
+        self.workers = workers
+        self.timing_hook = timing_hook
+        self.preview_regions = tuple(preview_regions)
+        # cortical name -> preallocated buffer holding the downsized region of every camera side by side
+        self.mosaic = {}
+        self.mosaic_key = None
+        self.mosaic_lock = threading.Lock()
+        # cortical name -> ping-pong pair for the downsized frame, and the difference/threshold buffers
+        self.frame_buffers = {}
+        self.change_buffers = {}
+        self.thread_pool = None
+        self.thread_pool_size = 0
+        self.burst_count = 0
+        # camera -> packed buffer of the remap sampling, and the grayscale copy of the frame
+        self.remap_buffers = {}
+        self.gray_buffers = {}
+        # camera -> shrunk frame, see prescale()
+        self.prescale_buffers = {}
+        # (camera, cortical name) -> grayscale crop flipped before resizing, see downsize_regions()
+        self.flip_buffers = {}
+        # camera -> (region layout, thumbnail of the last processed blocks, enhancement values), see static_regions()
+        self.gate_references = {}
+        # camera -> (sampled pixels, thumbnail) buffers of change_gate_thumbnail()
+        self.gate_buffers = {}
+        # (resize_list generation, index and state of every camera) -> areas of each camera, see region_cameras()
+        self.region_camera_key = None
+        self.region_camera_ids = {}
+
+    def process(self, raw_data_from_controller, capabilities, previous_frame_data, rgb, actual_capabilities,
+                compare_image=None, downsized_regions=None):
+        """
+        Run one burst through the pipeline.
+
+        Inputs:
+        - raw_data_from_controller: A frame, or a dictionary of frames keyed by camera. It is not
+                                    used when `downsized_regions` is given.
+        - capabilities: The capabilities of the controller.
+        - previous_frame_data: The regions of the previous burst, as returned by the last call.
+        - rgb: Dictionary receiving the FEAGI data under 'camera'.
+        - actual_capabilities: The runtime capabilities that override `capabilities`.
+        - compare_image: Overrides the diff stage for this burst when not None.
+        - downsized_regions: Regions already cropped and downsized for the current layout, keyed by
+                             camera then by cortical area, such as the ones kept by
+                             `trainer.TrainingSetCache`. The gate, blink, crop and downsize stages
+                             are skipped for them.
+
+        Output:
+        - (previous_frame_data, rgb, capabilities, modified_data_dict). modified_data_dict holds the
+          thresholded change of every region. Until the genome is received, the first two are the
+          empty `pns.resize_list` and the last one is empty.
+        """
+        global current_dimension_list
+
+        if downsized_regions is not None:
+            raw_data_from_controller = downsized_regions
+        elif isinstance(raw_data_from_controller, numpy.ndarray):
+            raw_data_from_controller = {0: raw_data_from_controller}
+        capabilities = pns.create_runtime_default_list(capabilities, actual_capabilities)
+        if not pns.resize_list:
+            return pns.resize_list, pns.resize_list, capabilities, {}  # sending empty dict
         current_dimension_list = pns.resize_list
-
-        all_vision_data_list = {}
+        if compare_image is None:
+            compare_image = 'diff' in self.stages
+        timings = {}
+        camera = capabilities['input']['camera'][str(list(raw_data_from_controller)[-1])]
+        region_cameras = self.region_cameras(raw_data_from_controller, capabilities)
+        skipped_regions = self.skipped_regions(region_cameras, capabilities, previous_frame_data)
+        self.burst_count += 1
+        thumbnails = {}
+        if 'gate' in self.stages and compare_image and previous_frame_data and downsized_regions is None:
+            started = self.start_timer()
+            static_regions, thumbnails = self.static_regions(raw_data_from_controller, capabilities,
+                                                             previous_frame_data)
+            skipped_regions = skipped_regions.union(static_regions)
+            self.stop_timer(timings, 'gate', started)
+
+        compressed_data = dict()
+        if downsized_regions is None:
+            camera_regions = self.downsize_all_cameras(raw_data_from_controller, capabilities, previous_frame_data,
+                                                       timings, skipped_regions)
+        else:
+            camera_regions = self.reuse_downsized_regions(downsized_regions, capabilities, previous_frame_data,
+                                                          timings, skipped_regions)
         for obtain_raw_data in raw_data_from_controller:
-            raw_frame[obtain_raw_data] = []
-            if not capabilities['input']['camera'][str(obtain_raw_data)]['disabled']:
-                if capabilities['input']['camera'][str(obtain_raw_data)]["mirror"]:
-                    raw_frame[obtain_raw_data] = cv2.flip(raw_data_from_controller[obtain_raw_data], 1)
-                else:
-                    raw_frame[obtain_raw_data] = raw_data_from_controller[obtain_raw_data]
-                # Blink accommodation
-                if len(capabilities['input']['camera'][str(obtain_raw_data)]['blink']) > 0:
-                    raw_frame[obtain_raw_data] = vision_blink(raw_data_from_controller[obtain_raw_data],
-                                                              capabilities['input']['camera'][str(obtain_raw_data)][
-                                                                  'blink'])
-                    capabilities['input']['camera'][str(obtain_raw_data)]['blink'] = []
-
-                # Eccentricity and modulation and size adjustment
-                region_coordinates = vision_region_coordinates(
-                    frame_width=raw_frame[obtain_raw_data].shape[1],
-                    frame_height=raw_frame[obtain_raw_data].shape[0],
-                    x1=abs(capabilities['input']['camera'][str(obtain_raw_data)]['eccentricity_control'][
-                               'X offset percentage']),
-                    x2=abs(capabilities['input']['camera'][str(obtain_raw_data)]['modulation_control'][
-                               'X offset percentage']),
-                    y1=abs(capabilities['input']['camera'][str(obtain_raw_data)]['eccentricity_control'][
-                               'Y offset percentage']),
-                    y2=abs(capabilities['input']['camera'][str(obtain_raw_data)]['modulation_control'][
-                               'Y offset percentage']),
-                    camera_index=capabilities['input']['camera'][str(obtain_raw_data)]['index'],
-                    size_list=current_dimension_list)
-                if not region_coordinates:
-                    if not (capabilities['input']['camera'][str(obtain_raw_data)][
-                                'index'] + '_C') in current_dimension_list:
-                        pns.resize_list.update(
-                            obtain_cortical_vision_size(camera_index=capabilities['input']['camera'][
-                                str(obtain_raw_data)]['index'], response=pns.full_list_dimension))
-                # Split visual data to segments accounting for central vision and peripheral vision
-                segmented_frame_data = split_vision_regions(coordinates=region_coordinates,
-                                                            raw_frame_data=raw_frame[obtain_raw_data])
-
-                if len(all_vision_data_list) == 0:
-                    for region in segmented_frame_data:
-                        all_vision_data_list[region] = []
-
-                compressed_data = dict()
-                # Applying lighting enhancements including brightness, contrast, and shadows
-                for cortical in segmented_frame_data:
-                    name = 'iv' + cortical
-                    updated_size = grab_cortical_resolution(name, cortical)
-                    compressed_data[cortical] = downsize_regions(frame=segmented_frame_data[cortical],
-                                                                 resize=updated_size)
-                    if 0 in capabilities['input']['camera'][str(obtain_raw_data)]['enhancement']:
-                        compressed_data[cortical] = adjust_brightness(image=compressed_data[cortical],
-                                                                      bright=capabilities['input']['camera'][
-                                                                          str(obtain_raw_data)]['enhancement'][0])
-                    if 1 in capabilities['input']['camera'][str(obtain_raw_data)]['enhancement']:
-                        compressed_data[cortical] = adjust_contrast(image=compressed_data[cortical],
-                                                                    contrast=capabilities['input']['camera'][
-                                                                        str(obtain_raw_data)]['enhancement'][1])
-                    if 2 in capabilities['input']['camera'][str(obtain_raw_data)]['enhancement']:
-                        compressed_data[cortical] = adjust_shadow(image=compressed_data[cortical],
-                                                                  shadow=capabilities['input']['camera'][
-                                                                      str(obtain_raw_data)]['enhancement'][2])
-                    if len(all_vision_data_list[
-                               cortical]) == 0:  # update the newest data into empty all_vision_data_list
-                        all_vision_data_list[cortical] = compressed_data[cortical]
-                    else:
-                        all_vision_data_list[cortical] = numpy.concatenate(
-                            (all_vision_data_list[cortical], compressed_data[cortical]), axis=1)
-                        if (len(raw_frame) - 1) == obtain_raw_data:  # Reach to end of the list for camera
-                            all_vision_data_list[cortical] = cv2.resize(all_vision_data_list[cortical],
-                                                                        grab_xy_cortical_resolution(name),
-                                                                        interpolation=cv2.INTER_AREA)
+            if camera_regions[obtain_raw_data] is not None:
+                compressed_data = camera_regions[obtain_raw_data]
+        started = self.start_timer()
+        all_vision_data_list = self.merge_camera_regions(camera_regions, previous_frame_data)
+        self.stop_timer(timings, 'downsize', started)
+        self.update_gate_references(thumbnails, skipped_regions)
 
-        # todo: add a shell frag such as --preview so when that is set the following code runs automatically
-        if preview_flag:
-            for segment in compressed_data:
-                if "_C" in segment or "CC" in segment:
-                    cv2.imshow(segment, compressed_data[segment])
-            if cv2.waitKey(30) & 0xFF == ord('q'):
-                pass
-
-        vision_dict = dict()
+        self.preview(compressed_data)
 
         # Generate FEAGI vision IPU data by detecting changes between current and prior frame
+        vision_dict = dict()
+        if 'emit' in self.stages and previous_frame_data:
+            # Skipped regions keep their previous frame and report no change until their next update
+            for get_region in skipped_regions.intersection(previous_frame_data):
+                if capabilities['input']['camera'][region_cameras[get_region][0]]['columnar_payload']:
+                    vision_dict[get_region] = np.zeros(0, dtype=columnar_dtype)
+                else:
+                    vision_dict[get_region] = {}
+        modified_data_dict = dict()
         for get_region in all_vision_data_list:
-            # In case of color vision
-            if current_dimension_list[get_region][2] == 3:
-                if previous_frame_data != {}:
-                    if get_region in previous_frame_data:
-                        modified_data = change_detector(
-                            previous=previous_frame_data[get_region],
-                            current=all_vision_data_list[get_region],
-                            src=capabilities['input']['camera'][str(obtain_raw_data)]['threshold_default'],
-                            compare_image=compare_image,
-                            cortical_name=get_region)
-                        vision_dict[get_region] = generate_vision_ipu_data(
-                            percentage=capabilities['input']['camera'][
-                                str(obtain_raw_data)]['percentage_to_allow_data'],
-                            cortical_name=get_region,
-                            pixel_change_threshold=modified_data,
-                            current=all_vision_data_list[get_region],
-                            previous=previous_frame_data[get_region],
-                            feagi_index=capabilities['input']['camera'][str(obtain_raw_data)]['feagi_index'])
-                    else:
-                        vision_dict[get_region] = change_detector(
-                            previous=np.zeros((3, 3, 3)),
-                            current=all_vision_data_list[get_region],
-                            src=capabilities['input']['camera'][str(obtain_raw_data)]['threshold_default'],
-                            compare_image=compare_image,
-                            cortical_name=get_region)
-            else:
-                # In case of grayscale (which is depth 1)
-                if previous_frame_data != {}:
-                    if get_region in previous_frame_data:
-                        modified_data = change_detector(
-                            previous=previous_frame_data[get_region],
-                            current=all_vision_data_list[get_region],
-                            src=capabilities['input']['camera'][str(obtain_raw_data)]['threshold_default'],
-                            compare_image=compare_image,
-                            cortical_name=get_region)
-
-                        vision_dict[get_region] = generate_vision_ipu_data(
-                            percentage=capabilities['input']['camera'][str(obtain_raw_data)][
-                                'percentage_to_allow_data'],
-                            cortical_name=get_region,
-                            pixel_change_threshold=modified_data,
-                            current=all_vision_data_list[get_region],
-                            previous=previous_frame_data[get_region],
-                            feagi_index=capabilities['input']['camera'][str(obtain_raw_data)]['feagi_index'],
-                            grayscale=True)
-                    else:
-                        vision_dict[get_region] = change_detector(
-                            previous=np.zeros((3, 3, 3)),
-                            current=all_vision_data_list[get_region],
-                            src=capabilities,
-                            compare_image=compare_image,
-                            cortical_name=get_region)
+            if previous_frame_data == {}:
+                continue
+            region_camera = camera
+            if get_region in region_cameras:
+                region_camera = capabilities['input']['camera'][region_cameras[get_region][0]]
+            if get_region in previous_frame_data:
+                started = self.start_timer()
+                modified_data = self.diff(previous_frame_data[get_region], all_vision_data_list[get_region],
+                                          region_camera['threshold_default'], compare_image, get_region)
+                self.stop_timer(timings, 'diff', started)
+                if 'emit' in self.stages:
+                    started = self.start_timer()
+                    vision_dict[get_region] = generate_vision_ipu_data(
+                        percentage=region_camera['percentage_to_allow_data'],
+                        cortical_name=get_region,
+                        pixel_change_threshold=modified_data,
+                        current=all_vision_data_list[get_region],
+                        previous=previous_frame_data[get_region],
+                        feagi_index=region_camera['feagi_index'],
+                        grayscale=current_dimension_list[get_region][2] != 3,
+                        columnar=region_camera['columnar_payload'],
+                        change_budget=region_camera['change_budget'])
+                    self.stop_timer(timings, 'emit', started)
+                modified_data_dict[get_region] = modified_data
+            elif 'emit' in self.stages and region_camera['columnar_payload']:
+                # A new region has nothing to compare against yet
+                vision_dict[get_region] = np.zeros(0, dtype=columnar_dtype)
+            elif 'emit' in self.stages:
+                vision_dict[get_region] = change_detector(
+                    previous=np.zeros((3, 3, 3)),
+                    current=all_vision_data_list[get_region],
+                    src=region_camera['threshold_default'],
+                    compare_image=compare_image,
+                    cortical_name=get_region)
 
         if previous_frame_data:
             previous_frame_data.update(all_vision_data_list)
@@ -482,8 +1109,567 @@ def process_visual_stimuli(raw_data_from_controller, capabilities, previous_fram
         else:
             rgb['camera'] = vision_dict
 
-        return previous_frame_data, rgb, capabilities
-    return pns.resize_list, pns.resize_list, capabilities  # sending empty dict
+        if self.timing_hook is not None:
+            for stage in self.stage_names:
+                if stage in timings:
+                    self.timing_hook(stage, timings[stage])
+        return previous_frame_data, rgb, capabilities, modified_data_dict
+
+    def region_cameras(self, raw_data_from_controller, capabilities):
+        """
+        Return the camera whose settings each cortical area is processed with, as cortical name ->
+        (camera key in the capabilities, region name). The areas of a camera are named after its
+        index followed by a region name. Cameras sharing an index are merged into the same areas,
+        and the last enabled one of them gives the settings. Areas of no enabled camera are left
+        out. The result only changes with the genome or the cameras, so it is kept until then.
+        """
+        cameras = capabilities['input']['camera']
+        key = (pns.resize_list_generation,
+               tuple((camera_id, cameras[str(camera_id)]['index'], cameras[str(camera_id)]['disabled'])
+                     for camera_id in raw_data_from_controller))
+        if key != self.region_camera_key:
+            region_cameras = {}
+            for camera_id in raw_data_from_controller:
+                camera = cameras[str(camera_id)]
+                if camera['disabled']:
+                    continue
+                for region in vision_region_names:
+                    if camera['index'] + region in current_dimension_list:
+                        region_cameras[camera['index'] + region] = (str(camera_id), region)
+            self.region_camera_key = key
+            self.region_camera_ids = region_cameras
+        return self.region_camera_ids
+
+    def skipped_regions(self, region_cameras, capabilities, previous_frame_data):
+        """
+        Return the regions that sit out this burst. A region with an update rate of N is only
+        processed every Nth burst. Rates are looked up in the region_update_rate of the camera of
+        the region, by region name ('TL', '_C', 'CC'...); the eight outer regions fall back to the
+        'peripheral' entry. A region missing from previous_frame_data is never skipped, so every
+        region is seeded on its first burst.
+        """
+        skipped_regions = set()
+        for cortical, (camera_id, region) in region_cameras.items():
+            if cortical not in previous_frame_data:
+                continue
+            region_update_rate = capabilities['input']['camera'][camera_id]['region_update_rate']
+            if not region_update_rate:
+                continue
+            rate = region_update_rate.get(region)
+            if rate is None and region not in ('_C', 'CC'):
+                rate = region_update_rate.get('peripheral')
+            if rate and rate > 1 and self.burst_count % rate:
+                skipped_regions.add(cortical)
+        return skipped_regions
+
+    def static_regions(self, raw_data_from_controller, capabilities, previous_frame_data):
+        """
+        Return the regions whose blocks stayed within the change_gate of every enabled camera,
+        along with the thumbnails to remember once the burst is processed. A region counts as
+        static when no block mean of the thumbnail moved by more than change_gate since the
+        region was last processed. Nothing is static when a camera has no gate, a pending blink,
+        a new layout or a new enhancement, since the regions then change without the frame moving.
+        """
+        static_regions = None
+        thumbnails = {}
+        for camera_id in raw_data_from_controller:
+            camera = capabilities['input']['camera'][str(camera_id)]
+            if camera['disabled']:
+                continue
+            frame = raw_data_from_controller[camera_id]
+            if not camera['change_gate'] or len(camera['blink']) > 0:
+                return set(), {}
+            region_layout = vision_region_layout(frame_shape=frame.shape,
+                                                 mirror=camera["mirror"] and 'mirror' in self.stages,
+                                                 **self.layout_settings(camera))
+            thumbnail = change_gate_thumbnail(frame, *self.obtain_gate_buffers(camera_id, frame))
+            enhancement = self.gate_enhancement(camera)
+            thumbnails[camera_id] = (region_layout, thumbnail, frame.shape, enhancement)
+            reference = self.gate_references.get(camera_id)
+            if reference is None or reference[0] is not region_layout or reference[1].shape != thumbnail.shape \
+                    or reference[2] != enhancement:
+                static_regions = set()
+                continue
+            block_change = cv2.absdiff(thumbnail, reference[1])
+            camera_static = set()
+            for region, blocks in change_gate_blocks(region_layout, frame.shape).items():
+                if region in previous_frame_data and \
+                        (blocks is None or block_change[blocks].max() <= camera['change_gate']):
+                    camera_static.add(region)
+            if static_regions is None:
+                static_regions = camera_static
+            else:
+                static_regions.intersection_update(camera_static)
+        return static_regions or set(), thumbnails
+
+    def update_gate_references(self, thumbnails, skipped_regions):
+        """
+        Remember the thumbnail blocks of the regions processed during this burst. Regions that
+        were left out keep the blocks of the frame they were last processed with, so slow
+        changes add up until they cross the gate. Neighbouring regions share the blocks on their
+        borders, and _C and CC overlap the peripheral regions, so a block is only updated when no
+        left out region covers it.
+        """
+        for camera_id, (region_layout, thumbnail, frame_shape, enhancement) in thumbnails.items():
+            reference = self.gate_references.get(camera_id)
+            if reference is None or reference[0] is not region_layout or reference[1].shape != thumbnail.shape \
+                    or reference[2] != enhancement:
+                # The thumbnail buffer is reused by the next burst
+                self.gate_references[camera_id] = (region_layout, thumbnail.copy(), enhancement)
+                continue
+            region_blocks = change_gate_blocks(region_layout, frame_shape)
+            updated = np.zeros(thumbnail.shape[:2], dtype=bool)
+            for region, blocks in region_blocks.items():
+                if blocks is not None and region not in skipped_regions:
+                    updated[blocks] = True
+            for region, blocks in region_blocks.items():
+                if blocks is not None and region in skipped_regions:
+                    updated[blocks] = False
+            if thumbnail.ndim == 3:
+                updated = updated[:, :, None]
+            np.copyto(reference[1], thumbnail, where=updated)
+
+    def gate_enhancement(self, camera):
+        """
+        Return the enhancement values the regions of the camera are built with, the same ones
+        `obtain_enhancement_lut()` keys its table on, or None when the enhance stage does not run.
+        """
+        if 'enhance' not in self.stages:
+            return None
+        return tuple(sorted(camera['enhancement'].items()))
+
+    def obtain_gate_buffers(self, camera_id, frame):
+        """
+        Return the (sampled pixels, thumbnail) buffers `change_gate_thumbnail()` writes into for
+        the camera, reallocated only when the number of channels of the frame changes.
+        """
+        width, height = change_gate_size
+        channels = frame.shape[2:]
+        buffers = self.gate_buffers.get(camera_id)
+        if buffers is None or buffers[1].shape[2:] != channels or buffers[1].dtype != frame.dtype:
+            buffers = (np.zeros((height * change_gate_samples, width * change_gate_samples) + channels,
+                                dtype=frame.dtype),
+                       np.zeros((height, width) + channels, dtype=frame.dtype))
+            self.gate_buffers[camera_id] = buffers
+        return buffers
+
+    def start_timer(self):
+        if self.timing_hook is None:
+            return None
+        return perf_counter()
+
+    def stop_timer(self, timings, stage, started):
+        if started is not None:
+            timings[stage] = timings.get(stage, 0.0) + perf_counter() - started
+
+    def blink(self, frame, blink):
+        return vision_blink(frame, blink)
+
+    def crop(self, frame, camera, split=True, mirror=False):
+        """
+        Return the region layout of the camera and the frame split into its regions. Without
+        `split`, only the layout is returned and the regions are None. With `mirror`, the layout
+        describes the mirrored regions.
+        """
+        region_layout = vision_region_layout(frame_shape=frame.shape, mirror=mirror,
+                                             **self.layout_settings(camera))
+        if not region_layout:
+            if not (camera['index'] + '_C') in current_dimension_list:
+                pns.resize_list.update(
+                    obtain_cortical_vision_size(camera_index=camera['index'], response=pns.full_list_dimension))
+                pns.update_resize_list_generation()
+        if not split:
+            return region_layout, None
+        return region_layout, split_vision_regions_from_layout(region_layout=region_layout, raw_frame_data=frame)
+
+    def layout_settings(self, camera):
+        return {'x1': abs(camera['eccentricity_control']['X offset percentage']),
+                'x2': abs(camera['modulation_control']['X offset percentage']),
+                'y1': abs(camera['eccentricity_control']['Y offset percentage']),
+                'y2': abs(camera['modulation_control']['Y offset percentage']),
+                'camera_index': camera['index'],
+                'size_list': current_dimension_list}
+
+    def prescale(self, camera_id, frame, camera):
+        """
+        Shrink the frame by `vision_prescale_factor()` with INTER_AREA, into a buffer kept per
+        camera. The right and bottom edges are trimmed to a multiple of the factor so OpenCV can
+        use its fast integer path. The frame is returned as is when it cannot be shrunk.
+        """
+        factor = vision_prescale_factor(frame_shape=frame.shape, **self.layout_settings(camera))
+        if factor < 2:
+            return frame
+        height, width = frame.shape[0] // factor, frame.shape[1] // factor
+        shape = (height, width) + frame.shape[2:]
+        prescaled = self.prescale_buffers.get(camera_id)
+        if prescaled is None or prescaled.shape != shape or prescaled.dtype != frame.dtype:
+            prescaled = np.zeros(shape, dtype=frame.dtype)
+        self.prescale_buffers[camera_id] = prescaled
+        return copy_into_destination(cv2.resize(frame[:height * factor, :width * factor], (width, height),
+                                                dst=prescaled, interpolation=cv2.INTER_AREA), prescaled)
+
+    def downsize(self, region, size, dst=None, mirror_map=None, flip_buffer=None):
+        return downsize_regions(frame=region, resize=size, dst=dst, mirror_map=mirror_map, flip_buffer=flip_buffer)
+
+    def obtain_flip_buffer(self, camera_id, cortical_name, region, size, mirror_map):
+        """
+        Return the buffer a mirrored grayscale region is flipped into before resizing, or None
+        when `downsize_regions()` flips the small result instead. It is reallocated only when the
+        crop changes shape.
+        """
+        if mirror_map is None or size[2] != 1 or region.ndim != 2 or \
+                (region.shape[1] % size[0] == 0 and region.shape[0] % size[1] == 0):
+            return None
+        buffer = self.flip_buffers.get((camera_id, cortical_name))
+        if buffer is None or buffer.shape != region.shape:
+            buffer = np.zeros(region.shape, dtype=region.dtype)
+            self.flip_buffers[(camera_id, cortical_name)] = buffer
+        return buffer
+
+    def grayscale(self, camera_id, frame, region_layout, segmented_frame_data, skipped_regions=()):
+        """
+        Convert the part of the frame covered by grayscale regions once, into a buffer kept per
+        camera, and point the grayscale regions of `segmented_frame_data` at it. This replaces a
+        cvtColor per region inside `downsize_regions()`.
+        """
+        if frame.ndim != 3 or frame.shape[2] != 3:
+            return
+        bounds = grayscale_bounds(region_layout, skipped_regions)
+        if bounds is None:
+            return
+        rows, columns = bounds
+        shape = (rows.stop - rows.start, columns.stop - columns.start)
+        gray_frame = self.gray_buffers.get(camera_id)
+        if gray_frame is None or gray_frame.shape != shape:
+            gray_frame = np.zeros(shape, dtype=np.uint8)
+        gray_frame = cv2.cvtColor(frame[bounds], cv2.COLOR_BGR2GRAY, dst=gray_frame)
+        self.gray_buffers[camera_id] = gray_frame
+        for region, ((region_rows, region_columns), size, _) in region_layout.items():
+            if size[2] == 1 and region not in skipped_regions:
+                segmented_frame_data[region] = gray_frame[region_rows.start - rows.start:region_rows.stop - rows.start,
+                                                          region_columns.start - columns.start:
+                                                          region_columns.stop - columns.start]
+
+    def sample(self, camera_id, frame, region_layout):
+        """
+        Downsize every region at once with `sample_vision_regions()`. The packed buffer of each
+        camera is kept across bursts.
+        """
+        remap_plan = vision_remap_layout(region_layout)
+        packed = self.remap_buffers.get(camera_id)
+        shape = remap_plan[0].shape + frame.shape[2:]
+        if packed is None or packed.shape != shape or packed.dtype != frame.dtype:
+            packed = np.zeros(shape, dtype=frame.dtype)
+        sampled, self.remap_buffers[camera_id] = sample_vision_regions(frame, remap_plan, dst=packed)
+        return sampled
+
+    def enhance(self, region, lut, enhancement):
+        return apply_enhancement(image=region, lut=lut, enhancement=enhancement, dst=region)
+
+    def diff(self, previous, current, threshold, compare_image, cortical_name):
+        return change_detector(previous=previous, current=current, src=threshold, compare_image=compare_image,
+                               cortical_name=cortical_name,
+                               buffers=self.obtain_change_buffers(cortical_name, current))
+
+    def downsize_camera_regions(self, camera_id, raw_data, capabilities, mosaic_slot=None, camera_count=1,
+                                previous_frame_data=None, skipped_regions=()):
+        """
+        Run the per-camera stages on one frame: mirror, blink, crop, downsize and enhance.
+
+        Inputs:
+        - camera_id: Key of the camera inside raw_data_from_controller.
+        - raw_data: The raw frame of that camera.
+        - capabilities: The runtime capabilities generated by `pns.create_runtime_default_list()`.
+        - mosaic_slot: Position of the camera inside the multi-camera mosaic, or None to give every
+                       region its own array.
+        - camera_count: Number of cameras sharing the mosaic.
+        - previous_frame_data: When given, a camera outside of a mosaic downsizes straight into the
+                               ping-pong buffers of `obtain_frame_buffer()`.
+        - skipped_regions: Regions that are not updated during this burst.
+
+        Output:
+        - (regions, timings). regions holds the downsized data of every region, or is None when the
+          camera is disabled. With a mosaic slot, the values are views into the mosaic.
+        """
+        timings = {}
+        camera = capabilities['input']['camera'][str(camera_id)]
+        if camera['disabled']:
+            return None, timings
+        frame = raw_data
+        mirror = camera["mirror"] and 'mirror' in self.stages
+        # Blink accommodation
+        if 'blink' in self.stages and len(camera['blink']) > 0:
+            started = self.start_timer()
+            frame = self.blink(raw_data, camera['blink'])
+            camera['blink'] = []
+            # The blink frame has never been mirrored
+            mirror = False
+            self.stop_timer(timings, 'blink', started)
+
+        if camera['prescale']:
+            started = self.start_timer()
+            frame = self.prescale(camera_id, frame, camera)
+            self.stop_timer(timings, 'downsize', started)
+
+        # Eccentricity and modulation: split the frame into central and peripheral vision
+        remap_sampling = camera['sampling'] == 'remap'
+        started = self.start_timer()
+        region_layout, segmented_frame_data = self.crop(frame, camera, split=not remap_sampling, mirror=mirror)
+        self.stop_timer(timings, 'crop', started)
+        started = self.start_timer()
+        if remap_sampling:
+            sampled_data = self.sample(camera_id, frame, region_layout)
+        else:
+            self.grayscale(camera_id, frame, region_layout, segmented_frame_data, skipped_regions)
+        self.stop_timer(timings, 'downsize', started)
+
+        compressed_data = dict()
+        # Applying lighting enhancements including brightness, contrast, and shadows
+        enhancement_lut = None
+        if 'enhance' in self.stages:
+            enhancement_lut = obtain_enhancement_lut(str(camera_id), camera['enhancement'])
+        for cortical in region_layout:
+            if cortical in skipped_regions:
+                continue
+            started = self.start_timer()
+            destination = None
+            if mosaic_slot is not None:
+                destination = self.obtain_mosaic_slot(cortical, region_layout[cortical][1], mosaic_slot,
+                                                      camera_count)
+            elif previous_frame_data is not None:
+                destination = self.obtain_frame_buffer(cortical, region_buffer_shape(region_layout[cortical][1]),
+                                                       previous_frame_data.get(cortical))
+            if not remap_sampling:
+                region, size, mirror_map = segmented_frame_data[cortical], region_layout[cortical][1], \
+                    region_layout[cortical][2]
+                compressed_data[cortical] = self.downsize(
+                    region, size, dst=destination, mirror_map=mirror_map,
+                    flip_buffer=self.obtain_flip_buffer(camera_id, cortical, region, size, mirror_map))
+            elif destination is not None:
+                compressed_data[cortical] = copy_into_destination(sampled_data[cortical], destination)
+            else:
+                compressed_data[cortical] = sampled_data[cortical].copy()
+            self.stop_timer(timings, 'downsize', started)
+            if enhancement_lut is not None:
+                started = self.start_timer()
+                compressed_data[cortical] = self.enhance(compressed_data[cortical], enhancement_lut,
+                                                         camera['enhancement'])
+                self.stop_timer(timings, 'enhance', started)
+        return compressed_data, timings
+
+    def downsize_all_cameras(self, raw_data_from_controller, capabilities, previous_frame_data=None,
+                             timings=None, skipped_regions=()):
+        """
+        Call `downsize_camera_regions()` for every camera. With more than one camera and a thread
+        pool, the cameras run in parallel since the cv2 calls release the GIL. The results always
+        come back in camera order, and their stage timings are added to `timings`.
+
+        With more than one enabled camera, each camera writes its regions straight into its own slot
+        of the mosaic instead of allocating new arrays.
+        """
+        enabled_cameras = [camera_id for camera_id in raw_data_from_controller
+                           if not capabilities['input']['camera'][str(camera_id)]['disabled']]
+        mosaic_slot = dict()
+        if len(enabled_cameras) > 1:
+            for camera_id in enabled_cameras:
+                mosaic_slot[camera_id] = len(mosaic_slot)
+        thread_pool = None
+        if len(raw_data_from_controller) > 1:
+            thread_pool = self.obtain_thread_pool()
+        if thread_pool is None:
+            results = {camera_id: self.downsize_camera_regions(camera_id, raw_data_from_controller[camera_id],
+                                                               capabilities, mosaic_slot.get(camera_id),
+                                                               len(mosaic_slot), previous_frame_data,
+                                                               skipped_regions)
+                       for camera_id in raw_data_from_controller}
+        else:
+            pending = {camera_id: thread_pool.submit(self.downsize_camera_regions, camera_id,
+                                                     raw_data_from_controller[camera_id], capabilities,
+                                                     mosaic_slot.get(camera_id), len(mosaic_slot),
+                                                     previous_frame_data, skipped_regions)
+                       for camera_id in raw_data_from_controller}
+            results = {camera_id: pending[camera_id].result() for camera_id in raw_data_from_controller}
+        camera_regions = {}
+        for camera_id in results:
+            camera_regions[camera_id], camera_timings = results[camera_id]
+            if timings is not None:
+                for stage in camera_timings:
+                    timings[stage] = timings.get(stage, 0.0) + camera_timings[stage]
+        return camera_regions
+
+    def reuse_downsized_regions(self, downsized_regions, capabilities, previous_frame_data=None, timings=None,
+                                skipped_regions=()):
+        """
+        Stand-in for `downsize_all_cameras()` when the regions were downsized ahead of time. They are
+        copied into the same buffers the downsize stage would have written, then enhanced, so the
+        given arrays are never modified and can be read-only.
+        """
+        enabled_cameras = [camera_id for camera_id in downsized_regions
+                           if not capabilities['input']['camera'][str(camera_id)]['disabled']]
+        camera_regions = {}
+        for camera_id in downsized_regions:
+            camera = capabilities['input']['camera'][str(camera_id)]
+            if camera['disabled']:
+                camera_regions[camera_id] = None
+                continue
+            enhancement_lut = None
+            if 'enhance' in self.stages:
+                enhancement_lut = obtain_enhancement_lut(str(camera_id), camera['enhancement'])
+            compressed_data = dict()
+            for cortical, region in downsized_regions[camera_id].items():
+                if cortical in skipped_regions:
+                    continue
+                started = self.start_timer()
+                if len(enabled_cameras) > 1:
+                    size = (region.shape[1], region.shape[0], region.shape[2] if region.ndim == 3 else 1)
+                    destination = self.obtain_mosaic_slot(cortical, size, enabled_cameras.index(camera_id),
+                                                          len(enabled_cameras))
+                elif previous_frame_data is not None:
+                    destination = self.obtain_frame_buffer(cortical, region.shape, previous_frame_data.get(cortical))
+                else:
+                    destination = np.zeros(region.shape, dtype=np.uint8)
+                compressed_data[cortical] = copy_into_destination(region, destination)
+                self.stop_timer(timings, 'downsize', started)
+                if enhancement_lut is not None:
+                    started = self.start_timer()
+                    compressed_data[cortical] = self.enhance(compressed_data[cortical], enhancement_lut,
+                                                             camera['enhancement'])
+                    self.stop_timer(timings, 'enhance', started)
+            camera_regions[camera_id] = compressed_data
+        return camera_regions
+
+    def merge_camera_regions(self, camera_regions, previous_frame_data=None):
+        """
+        Combine the regions of every camera into one array per cortical area.
+
+        A single camera is used as is. With several cameras the regions already sit side by side in
+        the mosaic; the mosaic is scaled back to the per-device resolution when the cameras are
+        numbered 0..n-1, otherwise it is kept at its full width. With `previous_frame_data`, the
+        result lands in the ping-pong buffers of `obtain_frame_buffer()` instead of a new array.
+        """
+        enabled_cameras = [camera_id for camera_id in camera_regions if camera_regions[camera_id] is not None]
+        if not enabled_cameras:
+            return {}
+        if len(enabled_cameras) == 1:
+            return dict(camera_regions[enabled_cameras[0]])
+        last_camera = enabled_cameras[-1]
+        scale_back = (list(camera_regions).index(last_camera) == last_camera)
+        all_vision_data_list = {}
+        for cortical in camera_regions[enabled_cameras[0]]:
+            destination = None
+            if scale_back:
+                if previous_frame_data is not None:
+                    width, height = grab_xy_cortical_resolution('iv' + cortical)
+                    shape = (height, width) + self.mosaic[cortical].shape[2:]
+                    destination = self.obtain_frame_buffer(cortical, shape, previous_frame_data.get(cortical))
+                all_vision_data_list[cortical] = copy_into_destination(
+                    cv2.resize(self.mosaic[cortical], grab_xy_cortical_resolution('iv' + cortical),
+                               dst=destination, interpolation=cv2.INTER_AREA), destination)
+            elif previous_frame_data is not None:
+                destination = self.obtain_frame_buffer(cortical, self.mosaic[cortical].shape,
+                                                       previous_frame_data.get(cortical))
+                all_vision_data_list[cortical] = copy_into_destination(self.mosaic[cortical], destination)
+            else:
+                all_vision_data_list[cortical] = self.mosaic[cortical].copy()
+        return all_vision_data_list
+
+    def preview(self, compressed_data):
+        # todo: add a shell frag such as --preview so when that is set the following code runs automatically
+        if preview_flag:
+            # The regions live in buffers reused by the next burst, so the preview gets copies
+            obtain_vision_preview().show({segment: compressed_data[segment].copy() for segment in compressed_data
+                                          if any(region in segment for region in self.preview_regions)})
+
+    def obtain_mosaic_slot(self, cortical, size, mosaic_slot, camera_count):
+        """
+        Return the part of the preallocated multi-camera buffer of `cortical` that belongs to the
+        camera at `mosaic_slot`. Buffers are kept across bursts and only reallocated when the number
+        of cameras or the genome changes.
+        """
+        with self.mosaic_lock:
+            if self.mosaic_key != (camera_count, pns.resize_list_generation):
+                self.mosaic.clear()
+                self.mosaic_key = (camera_count, pns.resize_list_generation)
+            if cortical not in self.mosaic:
+                self.mosaic[cortical] = np.zeros(region_buffer_shape(size, camera_count), dtype=np.uint8)
+        return self.mosaic[cortical][:, size[0] * mosaic_slot:size[0] * (mosaic_slot + 1)]
+
+    def obtain_frame_buffer(self, cortical_name, shape, previous=None):
+        """
+        Ping-pong store for the downsized frame of a region. Each region owns two buffers; the one
+        that is not holding `previous` is handed out for the current burst, so the two swap roles
+        every burst and the previous frame is never overwritten.
+        """
+        buffers = self.frame_buffers.get(cortical_name)
+        if buffers is None or buffers[0].shape != shape:
+            buffers = (np.zeros(shape, dtype=np.uint8), np.zeros(shape, dtype=np.uint8))
+            self.frame_buffers[cortical_name] = buffers
+        if buffers[0] is previous:
+            return buffers[1]
+        return buffers[0]
+
+    def obtain_change_buffers(self, cortical_name, current):
+        """
+        Return the difference and threshold buffers of a region, allocating them only when the
+        region is new or its shape changed.
+        """
+        buffers = self.change_buffers.get(cortical_name)
+        if buffers is None or buffers[0].shape != current.shape or buffers[0].dtype != current.dtype:
+            buffers = (np.zeros_like(current), np.zeros_like(current))
+            self.change_buffers[cortical_name] = buffers
+        return buffers
+
+    def obtain_thread_pool(self):
+        """
+        Return the thread pool for per-camera processing, or None when fewer than 2 workers are
+        configured. The pool is recreated if the worker count changes.
+        """
+        workers = self.workers
+        if workers is None:
+            workers = parallel_camera_workers
+        if workers < 2:
+            return None
+        if self.thread_pool is None or self.thread_pool_size != workers:
+            if self.thread_pool is not None:
+                self.thread_pool.shutdown(wait=False)
+            self.thread_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='retina_camera')
+            self.thread_pool_size = workers
+        return self.thread_pool
+
+
+# Default pipelines of process_visual_stimuli() and process_visual_stimuli_trainer(). Their buffers
+# back the previous_frame_data of the burst before, so each one serves a single caller. Any other
+# vision loop of the process passes its own RetinaPipeline to those functions.
+vision_pipeline = RetinaPipeline()
+trainer_pipeline = RetinaPipeline(stages=('mirror', 'crop', 'downsize', 'enhance', 'diff', 'emit'),
+                                  preview_regions=("_C",))
+
+
+def process_visual_stimuli(raw_data_from_controller, capabilities, previous_frame_data, rgb, actual_capabilities,
+                           compare_image=True, pipeline=None):
+    """
+    Turn the camera frames into FEAGI vision data using `pipeline`, `vision_pipeline` by default.
+
+    The regions returned in previous_frame_data live in buffers of the pipeline that are written
+    again two bursts later. The default `vision_pipeline` is therefore meant for one vision loop per
+    process; another loop, such as a second robot or a test harness, passes its own `pipeline`
+    and keeps using it with the previous_frame_data it returns.
+
+    Order of operations:
+    1. Mirror, blink, crop, downsize and enhance every camera.
+    2. Merge the cameras into one array per cortical area.
+    3. Compare every region against the previous frame and threshold the difference.
+    4. Emit the changed pixels into rgb['camera'].
+
+    Output:
+    - (previous_frame_data, rgb, capabilities)
+    """
+    if pipeline is None:
+        pipeline = vision_pipeline
+    previous_frame_data, rgb, capabilities, _ = pipeline.process(
+        raw_data_from_controller, capabilities, previous_frame_data, rgb, actual_capabilities,
+        compare_image=compare_image)
+    return previous_frame_data, rgb, capabilities
 
 
 def activation_region_break_down(message_from_feagi, obtained_signals):
@@ -517,180 +1703,49 @@ def drop_high_frequency_events(data):
 
 
 def process_visual_stimuli_trainer(raw_data_from_controller, capabilities, previous_frame_data, rgb,
-                                   actual_capabilities, compare_image=False):
-    global current_dimension_list, current_mirror_status, preview_flag
-    raw_frame = {}
-    if isinstance(raw_data_from_controller, numpy.ndarray):
-        temp_dict = {0: raw_data_from_controller}
-        raw_data_from_controller = temp_dict.copy()
-
-    capabilities = pns.create_runtime_default_list(capabilities, actual_capabilities)
-    if pns.resize_list:
-        current_dimension_list = pns.resize_list
-        all_vision_data_list = {}
-        for obtain_raw_data in raw_data_from_controller:
-            raw_frame[obtain_raw_data] = []
-            if not capabilities['input']['camera'][str(obtain_raw_data)]['disabled']:
-                if capabilities['input']['camera'][str(obtain_raw_data)]["mirror"]:
-                    raw_frame[obtain_raw_data] = cv2.flip(raw_data_from_controller[obtain_raw_data], 1)
-                else:
-                    raw_frame[obtain_raw_data] = raw_data_from_controller[obtain_raw_data]
-                region_coordinates = vision_region_coordinates(
-                    frame_width=raw_frame[obtain_raw_data].shape[1],
-                    frame_height=raw_frame[obtain_raw_data].shape[0],
-                    x1=abs(capabilities['input']['camera'][str(obtain_raw_data)]['eccentricity_control'][
-                               'X offset percentage']),
-                    x2=abs(capabilities['input']['camera'][str(obtain_raw_data)]['modulation_control'][
-                               'X offset percentage']),
-                    y1=abs(capabilities['input']['camera'][str(obtain_raw_data)]['eccentricity_control'][
-                               'Y offset percentage']),
-                    y2=abs(capabilities['input']['camera'][str(obtain_raw_data)]['modulation_control'][
-                               'Y offset percentage']),
-                    camera_index=capabilities['input']['camera'][str(obtain_raw_data)]['index'],
-                    size_list=current_dimension_list)
-
-                if not region_coordinates:
-                    if not (capabilities['input']['camera'][str(obtain_raw_data)][
-                                'index'] + '_C') in current_dimension_list:
-                        pns.resize_list.update(
-                            obtain_cortical_vision_size(
-                                camera_index=capabilities['input']['camera'][str(obtain_raw_data)]['index'],
-                                response=pns.full_list_dimension))
-                segmented_frame_data = split_vision_regions(coordinates=region_coordinates,
-                                                            raw_frame_data=raw_frame[
-                                                                obtain_raw_data])
-
-                if len(all_vision_data_list) == 0:
-                    for region in segmented_frame_data:
-                        all_vision_data_list[region] = []
-                compressed_data = dict()
-
-                for cortical in segmented_frame_data:
-                    name = 'iv' + cortical
-                    updated_size = grab_cortical_resolution(name=name, cortical=cortical)
-                    compressed_data[cortical] = downsize_regions(frame=segmented_frame_data[cortical],
-                                                                 resize=updated_size)
-                    if 0 in capabilities['input']['camera'][str(obtain_raw_data)]['enhancement']:
-                        compressed_data[cortical] = adjust_brightness(image=compressed_data[cortical],
-                                                                      bright=capabilities['input']['camera'][
-                                                                          str(obtain_raw_data)]['enhancement'][0])
-                    if 1 in capabilities['input']['camera'][str(obtain_raw_data)]['enhancement']:
-                        compressed_data[cortical] = adjust_contrast(image=compressed_data[cortical],
-                                                                    contrast=capabilities['input']['camera'][
-                                                                        str(obtain_raw_data)]['enhancement'][1])
-                    if 2 in capabilities['input']['camera'][str(obtain_raw_data)]['enhancement']:
-                        compressed_data[cortical] = adjust_shadow(image=compressed_data[cortical],
-                                                                  shadow=capabilities['input']['camera'][
-                                                                      str(obtain_raw_data)]['enhancement'][2])
-                    if len(all_vision_data_list[cortical]) == 0:
-                        # update the newest data into empty all_vision_data_list
-                        all_vision_data_list[cortical] = compressed_data[cortical]
-                    else:
-                        all_vision_data_list[cortical] = numpy.concatenate(
-                            (all_vision_data_list[cortical], compressed_data[cortical]), axis=1)
-                        if (len(raw_frame) - 1) == obtain_raw_data:  # Reach to end of the list for camera
-                            all_vision_data_list[cortical] = cv2.resize(all_vision_data_list[cortical],
-                                                                        grab_xy_cortical_resolution(name),
-                                                                        interpolation=cv2.INTER_AREA)
+                                   actual_capabilities, compare_image=False, downsized_regions=None,
+                                   pipeline=None):
+    """
+    Same as `process_visual_stimuli()` without blink accommodation. By default the current frame is
+    thresholded instead of compared with the previous one. With `downsized_regions`, from
+    `trainer.TrainingSetCache` for example, the crop and downsize stages are skipped. Like there,
+    the default `trainer_pipeline` serves one caller; others pass their own `pipeline`.
 
-        vision_dict = dict()
-        if preview_flag:
-            for segment in compressed_data:
-                if "_C" in segment:
-                    cv2.imshow(segment, compressed_data[segment])
-            if cv2.waitKey(30) & 0xFF == ord('q'):
-                pass
-        modified_data_dict = {}
-        for get_region in all_vision_data_list:
-            if current_dimension_list[get_region][2] == 3:
-                if previous_frame_data != {}:
-                    if get_region in previous_frame_data:
-                        modified_data = change_detector(
-                            previous=previous_frame_data[get_region],
-                            current=all_vision_data_list[get_region],
-                            src=capabilities['input']['camera'][str(obtain_raw_data)]['threshold_default'],
-                            compare_image=compare_image, cortical_name=get_region)
-
-                        vision_dict[get_region] = generate_vision_ipu_data(
-                            percentage=capabilities['input']['camera'][str(obtain_raw_data)][
-                                'percentage_to_allow_data'],
-                            cortical_name=get_region,
-                            pixel_change_threshold=modified_data,
-                            current=all_vision_data_list[get_region],
-                            previous=previous_frame_data[get_region],
-                            feagi_index=capabilities['input']['camera'][str(obtain_raw_data)]['feagi_index'])
-
-                        modified_data_dict[get_region] = modified_data
-                    else:
-                        vision_dict[get_region] = change_detector(
-                            previous=np.zeros((3, 3, 3)),
-                            current=all_vision_data_list[get_region],
-                            src=capabilities['input']['camera'][str(obtain_raw_data)]['threshold_default'],
-                            compare_image=compare_image,
-                            cortical_name=get_region)
-            else:
-                if previous_frame_data != {}:
-                    if get_region in previous_frame_data:
-                        modified_data = change_detector(
-                            previous=previous_frame_data[get_region],
-                            current=all_vision_data_list[get_region],
-                            src=capabilities['input']['camera'][str(obtain_raw_data)]['threshold_default'],
-                            compare_image=compare_image,
-                            cortical_name=get_region)
-
-                        vision_dict[get_region] = generate_vision_ipu_data(
-                            percentage=capabilities['input']['camera'][str(obtain_raw_data)][
-                                'percentage_to_allow_data'],
-                            cortical_name=get_region,
-                            pixel_change_threshold=modified_data,
-                            current=all_vision_data_list[get_region],
-                            previous=previous_frame_data[get_region],
-                            feagi_index=capabilities['input']['camera'][str(obtain_raw_data)]['feagi_index'],
-                            grayscale=True)
-                        modified_data_dict[get_region] = modified_data
-                    else:
-                        vision_dict[get_region] = change_detector(
-                            previous=np.zeros((3, 3, 3)),
-                            current=all_vision_data_list[get_region],
-                            src=capabilities['input']['camera'][str(obtain_raw_data)]['threshold_default'],
-                            compare_image=compare_image,
-                            cortical_name=get_region)
-        if previous_frame_data:
-            previous_frame_data.update(all_vision_data_list)
-        else:
-            previous_frame_data = all_vision_data_list
-        if 'camera' in rgb:
-            rgb['camera'].update(vision_dict)
-        else:
-            rgb['camera'] = vision_dict
-        return previous_frame_data, rgb, capabilities, modified_data_dict
-    return pns.resize_list, pns.resize_list, capabilities, {}  # sending empty dict
+    Output:
+    - (previous_frame_data, rgb, capabilities, modified_data_dict)
+    """
+    if pipeline is None:
+        pipeline = trainer_pipeline
+    return pipeline.process(raw_data_from_controller, capabilities, previous_frame_data, rgb, actual_capabilities,
+                            compare_image=compare_image, downsized_regions=downsized_regions)
 
 
 def vision_progress(capabilities, feagi_settings, raw_frame):
+    """
+    Apply the vision OPU updates (eccentricity, modulation, enhancement, mirror, blink...) to the
+    capabilities. It sleeps until the FEAGI listener publishes a new burst, so updates are applied
+    as soon as they are received.
+    """
     global genome_tracker, previous_genome_timestamp
     burst_counter = {}
     while True:
-        message_from_feagi = pns.message_from_feagi
+        message_from_feagi = pns.wait_for_new_burst(burst_counter)
         opu_data_message_only = pns.obtain_opu_data(message_from_feagi)
-        if message_from_feagi is not None and message_from_feagi and \
-                message_from_feagi['burst_counter'] != burst_counter:
-            burst_counter = message_from_feagi['burst_counter']
-            capabilities = fetch_vision_turner(opu_data_message_only, capabilities)
-            capabilities = fetch_enhancement_data(opu_data_message_only, capabilities)
-            # capabilities = pns.fetch_threshold_type(opu_data_message_only, capabilities) # TODO: revisit this
-            capabilities = fetch_mirror_opu(opu_data_message_only, capabilities)
-            # Update resize if genome has been changed:
-            pns.check_genome_status(message_from_feagi, capabilities)
-            if isinstance(raw_frame, dict):
-                if 'vision' in raw_frame:
-                    capabilities = obtain_blink_data(raw_frame['vision'], message_from_feagi,
-                                                     capabilities)  # for javascript webcam
-            capabilities = eccentricity_control_update(opu_data_message_only, capabilities)
-            capabilities = modulation_control_update(opu_data_message_only, capabilities)
-            feagi_settings['feagi_burst_speed'] = pns.check_refresh_rate(message_from_feagi,
-                                                                         feagi_settings['feagi_burst_speed'])
-        sleep(feagi_settings['feagi_burst_speed'])
+        burst_counter = message_from_feagi['burst_counter']
+        capabilities = fetch_vision_turner(opu_data_message_only, capabilities)
+        capabilities = fetch_enhancement_data(opu_data_message_only, capabilities)
+        # capabilities = pns.fetch_threshold_type(opu_data_message_only, capabilities) # TODO: revisit this
+        capabilities = fetch_mirror_opu(opu_data_message_only, capabilities)
+        # Update resize if genome has been changed:
+        pns.check_genome_status(message_from_feagi, capabilities)
+        if isinstance(raw_frame, dict):
+            if 'vision' in raw_frame:
+                capabilities = obtain_blink_data(raw_frame['vision'], message_from_feagi,
+                                                 capabilities)  # for javascript webcam
+        capabilities = eccentricity_control_update(opu_data_message_only, capabilities)
+        capabilities = modulation_control_update(opu_data_message_only, capabilities)
+        feagi_settings['feagi_burst_speed'] = pns.check_refresh_rate(message_from_feagi,
+                                                                     feagi_settings['feagi_burst_speed'])
 
 
 def eccentricity_control_update(message_from_feagi, capabilities):
@@ -722,11 +1777,14 @@ def eccentricity_control_update(message_from_feagi, capabilities):
                         scaled_value = int((eccentricity_value * (ranges['max'] - ranges['min'])) + ranges['min'])
 
                         if eccentricity_index == 0:
+                            offset_name = "X offset percentage"
+                        else:
+                            offset_name = "Y offset percentage"
+                        if capabilities['input']['camera'][camera_index]["eccentricity_control"].get(
+                                offset_name) != scaled_value:
                             capabilities['input']['camera'][camera_index]["eccentricity_control"][
-                                "X offset percentage"] = scaled_value
-                        elif eccentricity_index == 1:
-                            capabilities['input']['camera'][camera_index]["eccentricity_control"][
-                                "Y offset percentage"] = scaled_value
+                                offset_name] = scaled_value
+                            clear_region_layout_cache()
 
     return capabilities
 
@@ -758,11 +1816,14 @@ def modulation_control_update(message_from_feagi, capabilities):
                         scaled_value = int((modulation_value * (ranges['max'] - ranges['min'])) + ranges['min'])
 
                         if modulation_index == 0:
+                            offset_name = "X offset percentage"
+                        else:
+                            offset_name = "Y offset percentage"
+                        if capabilities['input']['camera'][camera_index]["modulation_control"].get(
+                                offset_name) != scaled_value:
                             capabilities['input']['camera'][camera_index]["modulation_control"][
-                                "X offset percentage"] = scaled_value
-                        elif modulation_index == 1:
-                            capabilities['input']['camera'][camera_index]["modulation_control"][
-                                "Y offset percentage"] = scaled_value
+                                offset_name] = scaled_value
+                            clear_region_layout_cache()
 
     return capabilities
 
@@ -867,6 +1928,7 @@ def fetch_enhancement_data(message_from_feagi, capabilities):
                             for camera_index in capabilities['input']['camera']:
                                 capabilities['input']['camera'][camera_index]["enhancement"][enhancement_id] = \
                                     calculated_enhancement_value
+                                enhancement_lut_cache.pop(camera_index, None)
 
     return capabilities
 
@@ -876,11 +1938,38 @@ def update_astype(data):
 
 
 def RGB_list_to_ndarray(data, size):
-    new_rgb = np.array(data)
+    new_rgb = np.asarray(data)
     new_rgb = new_rgb.reshape(size[1], size[0], 3)
     return new_rgb
 
 
+def frame_from_buffer(data, width, height, channel_order='BGR', offset=0):
+    """
+    Turn raw pixels into a frame the retina can process, without copying them one by one.
+
+    Inputs:
+    - data: bytes, bytearray, memoryview or uint8 ndarray holding the pixels row by row.
+    - width, height: size of the image in pixels.
+    - channel_order: order of the channels in `data`, one of `ingest_channel_orders`.
+    - offset: number of bytes to skip at the start of `data`, such as a header.
+
+    Output:
+    - A uint8 ndarray of shape (height, width, 3) in BGR order, or (height, width) for GRAY. For BGR
+      and GRAY it is a view of `data`, read-only when `data` is bytes. The other orders are converted
+      with a single cvtColor.
+    """
+    if channel_order not in ingest_channel_orders:
+        raise ValueError("Unknown channel order: " + str(channel_order))
+    channels, conversion = ingest_channel_orders[channel_order]
+    frame = np.frombuffer(data, dtype=np.uint8, count=width * height * channels, offset=offset)
+    if channels == 1:
+        return frame.reshape(height, width)
+    frame = frame.reshape(height, width, channels)
+    if conversion is not None:
+        frame = cv2.cvtColor(frame, conversion)
+    return frame
+
+
 def flip_video(data):
     return cv2.flip(data, 1)
 
@@ -934,6 +2023,52 @@ def adjust_shadow(image, shadow=None):
     return image
 
 
+def build_enhancement_lut(enhancement):
+    """
+    Fuse brightness, contrast and shadow into one 256-entry lookup table.
+
+    All three are per-value uint8 transforms, so running the existing adjust_* functions over
+    every possible value once gives the exact same result as running them over each region.
+    """
+    lut = np.arange(256, dtype=np.uint8).reshape(1, 256)
+    if 0 in enhancement:
+        lut = adjust_brightness(image=lut, bright=enhancement[0])
+    if 1 in enhancement:
+        lut = adjust_contrast(image=lut, contrast=enhancement[1])
+    if 2 in enhancement:
+        lut = adjust_shadow(image=lut, shadow=enhancement[2])
+    return lut
+
+
+def obtain_enhancement_lut(camera_index, enhancement):
+    """
+    Return the cached enhancement lookup table of a camera, or None when no enhancement is set.
+    The table is rebuilt only after `fetch_enhancement_data()` changes the values.
+    """
+    if not enhancement:
+        return None
+    values = tuple(sorted(enhancement.items()))
+    if camera_index not in enhancement_lut_cache or enhancement_lut_cache[camera_index][0] != values:
+        enhancement_lut_cache[camera_index] = (values, build_enhancement_lut(enhancement))
+    return enhancement_lut_cache[camera_index][1]
+
+
+def apply_enhancement(image, lut, enhancement=None, dst=None):
+    """
+    Apply the fused enhancement table in one pass. Anything that is not uint8 goes through the
+    separate adjust_* functions instead. `dst` may be the image itself to enhance it in place.
+    """
+    if image.dtype == np.uint8:
+        return copy_into_destination(cv2.LUT(image, lut, dst=dst), dst)
+    if 0 in enhancement:
+        image = adjust_brightness(image=image, bright=enhancement[0])
+    if 1 in enhancement:
+        image = adjust_contrast(image=image, contrast=enhancement[1])
+    if 2 in enhancement:
+        image = adjust_shadow(image=image, shadow=enhancement[2])
+    return copy_into_destination(image, dst)
+
+
 def grab_visual_cortex_dimension(capabilities):
     cortical_area_exist_list = []
     index = []
@@ -39,6 +39,7 @@ global_api_address = ''  # Updated by feagi.connect_to_feagi
 global_websocket_address = ''  # Just a full address stored
 websocket = ''  # It will be an object to store
 msg_counter = 0 # for SeqID in feagi data aka message_to_feagi
+multipart_pickle_protocol = 5  # first protocol able to hand NumPy buffers out of band
 
 
 def app_host_info():
@@ -63,6 +64,13 @@ class PubSub:
     def send(self, message):
         self.socket.send_pyobj(message)
 
+    def send_multipart(self, frames):
+        """
+        Send the frames built by `message_to_multipart()` as one message. The buffers are handed to
+        ZMQ without being copied, so they must not be modified until the message is sent.
+        """
+        self.socket.send_multipart(frames, copy=False)
+
     def receive(self):
         try:
             payload = self.socket.recv_pyobj()
@@ -73,6 +81,14 @@ class PubSub:
             else:
                 print(e)
 
+    def receive_multipart(self):
+        """
+        Receive the frames of a multipart message without copying them. Decode them with
+        `multipart_to_message()`. A `Sub` needs to be created with conflate=False for it, ZMQ
+        aborts when a conflating socket receives a multipart message.
+        """
+        return self.socket.recv_multipart(copy=False)
+
     def terminate(self):
         self.socket.close()
 
@@ -95,13 +111,15 @@ class Pub(PubSub):
 
 class Sub(PubSub):
 
-    def __init__(self, address, bind=False, flags=None):
+    def __init__(self, address, bind=False, flags=None, conflate=True):
         PubSub.__init__(self)
         print(f"Sub -- Add - {address}, Bind - {bind}")
         self.flags = flags
         self.socket = self.context.socket(zmq.SUB)
         self.socket.setsockopt(zmq.SUBSCRIBE, ''.encode('utf-8'))
-        self.socket.setsockopt(zmq.CONFLATE, 1)
+        # Keeping only the latest message does not work with multipart messages, see receive_multipart()
+        if conflate:
+            self.socket.setsockopt(zmq.CONFLATE, 1)
         if bind:
             self.socket.bind(address)
         else:
@@ -119,32 +137,64 @@ async def fetch_feagi(feagi_opu_channel):
             # Decompress
             decompressed_data = lz4.frame.decompress(received_data)
             # Another decompress of json
-            pns.message_from_feagi = pickle.loads(decompressed_data)
+            pns.publish_message_from_feagi(pickle.loads(decompressed_data))
         else:
             # Directly obtain without any compressions
-            pns.message_from_feagi = received_data
+            pns.publish_message_from_feagi(received_data)
 
 
 def feagi_listener(feagi_opu_channel):
     while True:
         data = fetch_feagi(feagi_opu_channel)
         if data is not None:
-            pns.message_from_feagi = data
+            pns.publish_message_from_feagi(data)
         sleep(0.001)  # hardcoded and max second that it can run up to
         # print("inside router: ", pns.message_from_feagi['opu_data']['ov_ecc'])
 
 
 def send_feagi(message_to_feagi, feagi_ipu_channel, agent_settings):
     """
-    send data to FEAGI
+    send data to FEAGI. With 'multipart' set in agent_settings, the NumPy arrays of the message,
+    such as the columnar vision payload, travel in their own frames instead of being pickled.
     """
-    if agent_settings['compression']:
+    if agent_settings.get('multipart'):
+        feagi_ipu_channel.send_multipart(message_to_multipart(message_to_feagi, agent_settings['compression']))
+    elif agent_settings['compression']:
         serialized_data = pickle.dumps(message_to_feagi)
         feagi_ipu_channel.send(message=lz4.frame.compress(serialized_data))
     else:
         feagi_ipu_channel.send(message_to_feagi)
 
 
+def message_to_multipart(message, compress=False):
+    """
+    Split a message into the frames of a multipart send. The first frame is the pickled message
+    without its NumPy arrays, compressed with lz4 when `compress` is set. Every contiguous array is
+    pickled out of band instead, and its memory becomes one of the following frames as it is.
+
+    Output:
+    - [header, buffer, buffer...]
+    """
+    buffers = []
+    header = pickle.dumps(message, protocol=multipart_pickle_protocol, buffer_callback=buffers.append)
+    if compress:
+        header = lz4.frame.compress(header)
+    return [header] + [buffer.raw() for buffer in buffers]
+
+
+def multipart_to_message(frames):
+    """
+    Rebuild the message sent by `message_to_multipart()` from the received frames, which can be
+    bytes or zmq.Frame. The arrays are views of the frames rather than copies.
+    """
+    buffers = [frame.buffer if isinstance(frame, zmq.Frame) else frame for frame in frames]
+    header = bytes(buffers[0])
+    # An uncompressed header starts with the PROTO opcode of pickle
+    if header[:1] != pickle.PROTO:
+        header = lz4.frame.decompress(header)
+    return pickle.loads(header, buffers=buffers[1:])
+
+
 def fetch_aptr(get_size_for_aptr_cortical):
     try:
         raw_aptr = requests.get(get_size_for_aptr_cortical).json()
@@ -335,7 +385,7 @@ def websocket_recieve():
     global websocket, global_websocket_address
     while True:
         try:
-            pns.message_from_feagi = pickle.loads(websocket.recv())
+            pns.publish_message_from_feagi(pickle.loads(websocket.recv()))
         except Exception as e:
             print("error in websocket recieve: ", e)
             websocket = connect(global_websocket_address)
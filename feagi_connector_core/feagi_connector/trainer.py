@@ -1,16 +1,30 @@
 import os
 import re
 import cv2
+import copy
+import json
+import queue
+import shutil
+import hashlib
+import threading
+import numpy as np
+from concurrent.futures import Future, ThreadPoolExecutor
+from feagi_connector import retina
 from feagi_connector import sensors
+from feagi_connector import pns_gateway as pns
 
 image_extensions = ['.jpg', '.jpeg', '.png', '.bmp']
 video_extensions = ['.mov', '.mpg', '.mp4', '.gif']
+training_cache_folder = '.feagi_training_cache'  # created inside the training folder by TrainingSetCache
+prefetch_depth = 8  # frames decoded ahead of the training loop by prefetch_the_folder()
+prefetch_workers = 2  # threads decoding images for prefetch_the_folder()
 
-def scan_the_folder(path_direction):
+def scan_the_folder(path_direction, decode_images=True):
   """
   Generator to yield image files with specific pattern in filename.
   Useful for filtering training images provided by the user.
   Will ignore the file if it doesn't have #-#-# in the filename or isn't an image.
+  With decode_images set to False, the filename of an image is yielded instead of its pixels.
   """
   folder_path = path_direction
   files = os.listdir(folder_path)
@@ -30,7 +44,212 @@ def scan_the_folder(path_direction):
       name_only = os.path.splitext(filename)[0]
       id_message[name_only] = 100
       extension = os.path.splitext(filename)[1]
-      yield cv2.imread(path_direction + filename), id_message, extension
+      if decode_images:
+        yield cv2.imread(path_direction + filename), id_message, extension
+      else:
+        yield filename, id_message, extension
+
+
+def scan_the_folder_regions(capabilities, cache, camera_id=0):
+    """
+    Same as `scan_the_folder()` on the folder of `cache`, a `TrainingSetCache`, except that images
+    come out already cropped and downsized by the cache. They are yielded as {camera_id: regions},
+    ready for the `downsized_regions` argument of `retina.process_visual_stimuli_trainer()`. Videos
+    are yielded as a cv2.VideoCapture like before.
+    """
+    for data, id_message, extension in scan_the_folder(cache.folder, decode_images=False):
+        if extension.lower() in image_extensions:
+            data = {camera_id: cache.regions(data, capabilities, camera_id)}
+        yield data, id_message, extension
+
+
+def training_files(path_direction):
+    """
+    Yield (filename, id_message, extension) for every image and video of the folder that follows
+    the #-#-# naming of `scan_the_folder()`.
+    """
+    pattern = re.compile(r'\d+-\d+-\d+\..+')
+    for filename in os.listdir(path_direction):
+        name_only, extension = os.path.splitext(filename)
+        if pattern.match(filename) and extension.lower() in image_extensions + video_extensions:
+            yield filename, {name_only: 100}, extension
+
+
+def prefetch_the_folder(path_direction, depth=None, workers=None):
+    """
+    Decode the training files ahead of the training loop, so it does not wait on the disk or the
+    decoder. A loader thread walks the folder: images are decoded by a thread pool and videos are
+    read frame by frame. At most `depth` items wait in a queue, so memory stays bounded when the
+    loop is slower than the decoding.
+
+    Inputs:
+    - path_direction: Folder holding the training files.
+    - depth: Number of items decoded ahead. Defaults to `prefetch_depth`.
+    - workers: Number of threads decoding images. Defaults to `prefetch_workers`.
+
+    Output:
+    - Yields (frame, id_message, extension) in folder order: one item per image, and one per frame
+      of every video. A frame is None when the image could not be read.
+    """
+    if depth is None:
+        depth = prefetch_depth
+    if workers is None:
+        workers = prefetch_workers
+    pending = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    decoders = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='trainer_prefetch')
+    loader_errors = []
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                pending.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def load():
+        try:
+            for filename, id_message, extension in training_files(path_direction):
+                path = os.path.join(path_direction, filename)
+                if extension.lower() in image_extensions:
+                    if not put((decoders.submit(cv2.imread, path), id_message, extension)):
+                        return
+                    continue
+                cap = cv2.VideoCapture(path)
+                try:
+                    ret, frame = cap.read()
+                    while ret:
+                        if not put((frame, id_message, extension)):
+                            return
+                        ret, frame = cap.read()
+                finally:
+                    cap.release()
+        except Exception as error:
+            loader_errors.append(error)
+        finally:
+            put(None)
+
+    loader = threading.Thread(target=load, daemon=True, name='trainer_prefetch_loader')
+    loader.start()
+    try:
+        while True:
+            item = pending.get()
+            if item is None:
+                break
+            frame, id_message, extension = item
+            if isinstance(frame, Future):
+                frame = frame.result()
+            yield frame, id_message, extension
+        if loader_errors:
+            raise loader_errors[0]
+    finally:
+        stop.set()
+        # Cancel the decodes still waiting in the queue. shutdown(cancel_futures=True) needs Python 3.9
+        while True:
+            try:
+                item = pending.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None and isinstance(item[0], Future):
+                item[0].cancel()
+        decoders.shutdown(wait=False)
+
+
+class TrainingSetCache:
+    """
+    Keeps the downsized regions of every training image on disk, so a training pass does not need
+    to decode, crop and downsize the images again.
+
+    An entry is stored per image as one .npy file per region and loaded memory-mapped. It is keyed
+    by the modification time of the image and by `layout_signature()`, so changing an image or the
+    genome only rebuilds the entries that went stale. Enhancement is not part of the entries since
+    FEAGI can change it at any time; the trainer pipeline applies it on the cached regions.
+
+    Args:
+    - folder: Folder holding the training images.
+    - cache_folder: Where the entries are written. Defaults to `training_cache_folder` inside
+                    `folder`.
+    """
+
+    def __init__(self, folder, cache_folder=None):
+        self.folder = folder
+        if cache_folder is None:
+            cache_folder = os.path.join(folder, training_cache_folder)
+        self.cache_folder = cache_folder
+        # The blink, enhance, diff and emit stages run later, on the cached regions
+        self.pipeline = retina.RetinaPipeline(stages=('mirror', 'crop', 'downsize'))
+        # filename -> (entry key, memory-mapped regions)
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def layout_signature(self, capabilities, camera_id=0):
+        """
+        Fingerprint of everything the downsized regions depend on: the cortical sizes of the genome
+        and the camera settings that move or resample the regions.
+        """
+        camera = capabilities['input']['camera'][str(camera_id)]
+        layout = {'resize_list': sorted([name, list(size)] for name, size in pns.resize_list.items()),
+                  'eccentricity_control': camera['eccentricity_control'],
+                  'modulation_control': camera['modulation_control'],
+                  'index': camera['index'],
+                  'mirror': camera['mirror'],
+                  'sampling': camera['sampling'],
+                  'prescale': camera['prescale']}
+        return hashlib.sha1(json.dumps(layout, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def regions(self, filename, capabilities, camera_id=0):
+        """
+        Return the downsized regions of an image of the folder, keyed by cortical area. They are
+        read-only arrays, built and stored first if the entry is missing or stale. An empty dict is
+        returned until the genome is received.
+        """
+        if not pns.resize_list:
+            return {}
+        capabilities = pns.create_runtime_default_list(capabilities, capabilities)
+        path = os.path.join(self.folder, filename)
+        key = hashlib.sha1((repr(os.path.getmtime(path)) + self.layout_signature(capabilities, camera_id))
+                           .encode('utf-8')).hexdigest()
+        entry = self.entries.get(filename)
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry[1]
+        entry_folder = os.path.join(self.cache_folder, filename, key)
+        if os.path.isdir(entry_folder):
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.build_entry(path, capabilities, camera_id, entry_folder)
+        regions = {os.path.splitext(name)[0]: np.load(os.path.join(entry_folder, name), mmap_mode='r')
+                   for name in os.listdir(entry_folder)}
+        self.entries[filename] = (key, regions)
+        return regions
+
+    def build_entry(self, path, capabilities, camera_id, entry_folder):
+        """
+        Downsize the image and write its regions. They are written to a temporary folder that is
+        renamed once complete, and the stale entries of the image are removed afterwards. Arrays
+        still mapped from a removed entry stay valid. Every region is built whatever the
+        region_update_rate of the camera, which only applies once the entries are trained on.
+        """
+        frame = cv2.imread(path)
+        if frame is None:
+            raise ValueError("Unable to read the training image " + path)
+        capabilities = copy.deepcopy(capabilities)
+        capabilities['input']['camera'][str(camera_id)]['region_update_rate'] = {}
+        regions, _, _, _ = self.pipeline.process({camera_id: frame}, capabilities, {}, {}, capabilities)
+        temporary_folder = entry_folder + '.tmp'
+        shutil.rmtree(temporary_folder, ignore_errors=True)
+        os.makedirs(temporary_folder)
+        for cortical, region in regions.items():
+            np.save(os.path.join(temporary_folder, cortical + '.npy'), region)
+        os.rename(temporary_folder, entry_folder)
+        image_folder = os.path.dirname(entry_folder)
+        for name in os.listdir(image_folder):
+            if name != os.path.basename(entry_folder):
+                shutil.rmtree(os.path.join(image_folder, name), ignore_errors=True)
 
 
 def id_training_with_image(message_to_feagi, name_id):